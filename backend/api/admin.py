@@ -40,7 +40,8 @@ class IngredientAdmin(ModelAdmin):
 @register(Recipe)
 class RecipeAdmin(ModelAdmin):
     list_display = (
-        'name', 'author', 'get_image', 'id',
+        'name', 'author', 'get_image', 'favorites_count',
+        'shopping_carts_count', 'id',
     )
     fields = (
         ('name', 'cooking_time',),
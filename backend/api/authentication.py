@@ -0,0 +1,79 @@
+import hashlib
+from collections import Counter
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_KEY = 'auth-token:{}'
+
+# Недолгий кэш в памяти процесса и общий для процессов кэш. Кэш по
+# умолчанию в памяти процесса не общий: удаление токена не дошло бы
+# из него до других процессов, поэтому тогда он не используется.
+local_cache = caches['tokens']
+shared_cache = (
+    None if isinstance(caches['default'], LocMemCache) else caches['default'])
+
+_stats = Counter()
+_stats_lock = Lock()
+
+
+def get_cache_key(key):
+    """Ключ кэша по хешу токена, чтобы токены не хранились в открытом виде."""
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def _record(event):
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def get_stats():
+    """Попадания в кэши токенов текущего процесса."""
+    with _stats_lock:
+        stats = {
+            event: _stats[event] for event in ('local', 'shared', 'miss')}
+    total = sum(stats.values())
+    stats['hit_ratio'] = (
+        (stats['local'] + stats['shared']) / total if total else None)
+    return stats
+
+
+def invalidate_tokens(keys):
+    """Убрать токены из кэшей, следующий запрос прочитает их из базы."""
+    cache_keys = [get_cache_key(key) for key in keys]
+    if cache_keys:
+        local_cache.delete_many(cache_keys)
+        if shared_cache is not None:
+            shared_cache.delete_many(cache_keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, запоминающая токен вместе с пользователем.
+
+    Кэш процесса ограничен по размеру и времени жизни (AUTH_TOKEN_LOCAL_TTL),
+    общий кэш хранит записи AUTH_TOKEN_CACHE_TTL секунд. Записи удаляются
+    при удалении токена и при сохранении пользователя; в других процессах
+    запись кэша процесса живёт до AUTH_TOKEN_LOCAL_TTL секунд. Счётчики
+    пользователя меняются без сохранения, поэтому в закэшированном
+    пользователе они могут быть устаревшими."""
+
+    def authenticate_credentials(self, key):
+        cache_key = get_cache_key(key)
+        token = local_cache.get(cache_key)
+        if token is not None:
+            _record('local')
+            return token.user, token
+        token = None if shared_cache is None else shared_cache.get(cache_key)
+        if token is not None:
+            _record('shared')
+        else:
+            _record('miss')
+            _, token = super().authenticate_credentials(key)
+            if shared_cache is not None:
+                shared_cache.set(
+                    cache_key, token, settings.AUTH_TOKEN_CACHE_TTL)
+        local_cache.set(cache_key, token)
+        return token.user, token
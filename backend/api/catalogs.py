@@ -0,0 +1,188 @@
+import hashlib
+import logging
+from bisect import bisect_left, bisect_right
+from threading import Lock
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models.functions import Lower
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from api.db_router import use_primary
+from api.models import Ingredient, Tag
+from api.serializers import IngredientSerializer, TagSerializer
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog-version:{}'
+
+
+def get_version(catalog):
+    """Текущая версия справочника, общая для всех процессов через кэш."""
+    key = VERSION_KEY.format(catalog)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(catalog):
+    """Пометить справочник изменившимся."""
+    cache.set(VERSION_KEY.format(catalog), uuid4().hex, timeout=None)
+
+
+class VersionedCatalog:
+    """Данные справочника в памяти процесса.
+
+    Строятся при первом обращении и перестраиваются, когда меняется
+    версия справочника catalog."""
+    catalog = None
+
+    def __init__(self):
+        self._lock = Lock()
+        self._state = (None, None)
+
+    def build(self):
+        raise NotImplementedError
+
+    def get(self):
+        version = get_version(self.catalog)
+        if self._state[0] != version:
+            with self._lock:
+                if self._state[0] != version:
+                    # Реплика может ещё не получить изменения, из-за
+                    # которых сменилась версия.
+                    with use_primary():
+                        self._state = (version, self.build())
+        return self._state[1]
+
+
+class IngredientIndex(VersionedCatalog):
+    """Отсортированный массив названий ингредиентов для поиска по названию."""
+    catalog = 'ingredients'
+
+    def build(self):
+        rows = sorted(
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit'),
+            key=lambda row: (row[1].lower(), row[0]))
+        keys = [row[1].lower() for row in rows]
+        # Все названия одной строкой для поиска по подстроке средствами
+        # str.find и смещения начала каждого названия в ней.
+        offsets, position = [], 0
+        for key in keys:
+            offsets.append(position)
+            position += len(key) + 1
+        return keys, rows, '\n'.join(keys), offsets
+
+    def startswith(self, prefix, limit):
+        """Не более limit ингредиентов с названием на prefix."""
+        keys, rows, _, _ = self.get()
+        prefix = prefix.lower()
+        position = bisect_left(keys, prefix)
+        result = []
+        for key, row in zip(
+                keys[position:position + limit],
+                rows[position:position + limit]):
+            if not key.startswith(prefix):
+                break
+            result.append(row)
+        return result
+
+    def contains(self, query, limit):
+        """Ингредиенты, в названии которых query встречается не в начале."""
+        if connection.vendor == 'postgresql':
+            # Поиск по подстроке обслуживает GIN-индекс pg_trgm.
+            return list(
+                Ingredient.objects.filter(
+                    name__icontains=query
+                ).exclude(
+                    name__istartswith=query
+                ).order_by(
+                    Lower('name'), 'id'
+                ).values_list('id', 'name', 'measurement_unit')[:limit])
+        _, rows, names, offsets = self.get()
+        query = query.lower()
+        if '\n' in query:
+            return []
+        result = []
+        position = names.find(query)
+        while position != -1 and len(result) < limit:
+            index = bisect_right(offsets, position) - 1
+            if position != offsets[index]:
+                result.append(rows[index])
+            next_name = index + 1
+            if next_name == len(offsets):
+                break
+            position = names.find(query, offsets[next_name])
+        return result
+
+    def search(self, query, limit):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        result = self.startswith(query, limit)
+        if len(result) < limit:
+            result += self.contains(query, limit - len(result))
+        return [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit in result
+        ]
+
+
+class CatalogSnapshot(VersionedCatalog):
+    """Справочник целиком, заранее отрендеренный в JSON.
+
+    Хранит байты ответа и их ETag. ETag - хеш содержимого, поэтому
+    одинаков во всех процессах с одной и той же версией данных."""
+
+    def __init__(self, catalog, queryset, serializer_class):
+        super().__init__()
+        self.catalog = catalog
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+
+    def build(self):
+        body = JSONRenderer().render(
+            self.serializer_class(self.queryset.all(), many=True).data)
+        return body, '"{}"'.format(hashlib.sha256(body).hexdigest()[:32])
+
+    def response(self, request):
+        """Ответ со снимком или 304, если у клиента та же версия."""
+        body, etag = self.get()
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (
+                etag in parse_etags(if_none_match) or if_none_match == '*'):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class TagSlugs(VersionedCatalog):
+    """Соответствие слагов тэгов их идентификаторам."""
+    catalog = 'tags'
+
+    def build(self):
+        return dict(Tag.objects.values_list('slug', 'id'))
+
+
+ingredient_index = IngredientIndex()
+tag_slugs = TagSlugs()
+tag_snapshot = CatalogSnapshot('tags', Tag.objects.all(), TagSerializer)
+ingredient_snapshot = CatalogSnapshot(
+    'ingredients', Ingredient.objects.all(), IngredientSerializer)
+
+
+def warm_catalogs():
+    """Собрать снимки справочников заранее, до первого запроса."""
+    try:
+        tag_snapshot.get()
+        tag_slugs.get()
+        ingredient_snapshot.get()
+        ingredient_index.get()
+    except DatabaseError:
+        logger.exception('Не удалось подготовить справочники')
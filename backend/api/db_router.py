@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_KEY = 'db-pin:{}'
+SAFE_METHODS = ('GET', 'HEAD')
+# Токены и сессии читаются только с основной базы: сразу после входа
+# их на реплике может ещё не быть.
+PRIMARY_APPS = {'authtoken', 'sessions'}
+
+
+class RoutingState:
+    """Куда направлять чтение в рамках одного запроса."""
+
+    def __init__(self, replica_allowed):
+        self.replica_allowed = replica_allowed
+        self.alias = None
+        self.wrote = False
+
+
+_state = ContextVar('db_routing_state', default=None)
+_turns = count()
+_turns_lock = Lock()
+_down_until = {}
+
+
+def pick_replica():
+    """Следующая по кругу доступная реплика или основная база.
+
+    Реплика, к которой не удалось подключиться, пропускается
+    DB_REPLICA_RETRY_SECONDS секунд."""
+    replicas = settings.DATABASE_REPLICAS
+    for _ in replicas:
+        with _turns_lock:
+            alias = replicas[next(_turns) % len(replicas)]
+        now = time.monotonic()
+        if _down_until.get(alias, 0) > now:
+            continue
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning('Реплика %s недоступна', alias, exc_info=True)
+            _down_until[alias] = now + settings.DB_REPLICA_RETRY_SECONDS
+            continue
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_primary():
+    """Читать только с основной базы внутри блока."""
+    token = _state.set(None)
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    """Чтение в GET и HEAD запросах - с реплик, всё остальное - с основной.
+
+    Реплика выбирается один раз на запрос. После первой записи, внутри
+    transaction.atomic и вне запросов чтение идёт с основной базы."""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+                state is None
+                or not state.replica_allowed
+                or state.wrote
+                or model._meta.app_label in PRIMARY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        if state.alias is None:
+            state.alias = pick_replica()
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def get_client_keys(request, response=None):
+    """Ключи закрепления клиента: по токену и по cookie сессии."""
+    values = [
+        request.META.get('HTTP_AUTHORIZATION'),
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME),
+    ]
+    if response is not None and settings.SESSION_COOKIE_NAME in (
+            response.cookies):
+        values.append(response.cookies[settings.SESSION_COOKIE_NAME].value)
+    return [
+        PIN_KEY.format(hashlib.sha256(value.encode()).hexdigest())
+        for value in values if value
+    ]
+
+
+class ReplicaRoutingMiddleware:
+    """Разрешает чтение с реплик безопасным запросам.
+
+    Клиент, который что-то записал, DB_REPLICA_PIN_SECONDS секунд читает
+    с основной базы и видит свои изменения, даже если реплика отстаёт."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replica_allowed = request.method in SAFE_METHODS and not any(
+            cache.get_many(get_client_keys(request)).values())
+        state = RoutingState(replica_allowed)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            cache.set_many(
+                dict.fromkeys(get_client_keys(request, response), True),
+                settings.DB_REPLICA_PIN_SECONDS)
+        return response
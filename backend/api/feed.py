@@ -0,0 +1,162 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef, Q
+
+from api.models import Recipe, TimelineEntry
+from users.models import FeedState, Follow, User
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.FEED_BACKFILL_WORKERS,
+    thread_name_prefix='feed-backfill')
+
+
+def needs_backfill():
+    """Популярный автор, у которого подписчиков стало заметно меньше
+    FEED_FANOUT_LIMIT."""
+    return Q(
+        feed_state=FeedState.POPULAR,
+        followers_count__lte=(
+            settings.FEED_FANOUT_LIMIT - settings.FEED_FANOUT_MARGIN))
+
+
+def iter_follower_batches(author_id):
+    """Идентификаторы подписчиков автора пачками по FEED_BATCH_SIZE."""
+    last_id = 0
+    while True:
+        batch = list(
+            Follow.objects.filter(
+                author_id=author_id, user_id__gt=last_id
+            ).order_by('user_id').values_list(
+                'user_id', flat=True)[:settings.FEED_BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def add_entries(user_ids, recipes):
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+            for user_id in user_ids
+            for recipe_id, author_id in recipes
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True)
+
+
+def latest_recipes(author_ids):
+    """Последние FEED_BACKFILL_SIZE рецептов каждого из авторов."""
+    return list(
+        Recipe.objects.filter(
+            author_id__in=author_ids,
+            id__in=Recipe.objects.filter(
+                author_id=OuterRef('author_id')
+            ).order_by('-id').values('id')[:settings.FEED_BACKFILL_SIZE]
+        ).values_list('id', 'author_id'))
+
+
+def fan_out_recipe(recipe_id, author_id):
+    """Разложить новый рецепт по лентам подписчиков автора."""
+    feed_state = User.objects.filter(
+        pk=author_id).values_list('feed_state', flat=True).first()
+    if feed_state is None or feed_state == FeedState.POPULAR:
+        return
+    for user_ids in iter_follower_batches(author_id):
+        add_entries(user_ids, [(recipe_id, author_id)])
+
+
+def fan_out_author(author_id):
+    """Заполнить ленты всех подписчиков последними рецептами автора."""
+    recipes = latest_recipes([author_id])
+    for user_ids in iter_follower_batches(author_id):
+        add_entries(user_ids, recipes)
+
+
+def backfill_author(author_id):
+    """Вернуть автору раскладку рецептов по лентам подписчиков.
+
+    Пока ленты заполняются, новые рецепты уже раскладываются, а рецепты
+    автора по-прежнему подмешиваются при чтении."""
+    started = User.objects.filter(
+        needs_backfill(), pk=author_id
+    ).update(feed_state=FeedState.BACKFILL)
+    if not started:
+        return
+    fan_out_author(author_id)
+    # За это время автор мог снова стать популярным.
+    User.objects.filter(
+        pk=author_id, feed_state=FeedState.BACKFILL
+    ).update(feed_state=FeedState.FANOUT)
+
+
+def _run_backfill(author_id):
+    try:
+        backfill_author(author_id)
+    except Exception:
+        logger.exception('Не удалось заполнить ленты автора %s', author_id)
+        # Следующая отписка запустит заполнение заново.
+        User.objects.filter(
+            pk=author_id, feed_state=FeedState.BACKFILL
+        ).update(feed_state=FeedState.POPULAR)
+    finally:
+        connections.close_all()
+
+
+def schedule_fan_out(recipe):
+    transaction.on_commit(
+        lambda: fan_out_recipe(recipe.pk, recipe.author_id))
+
+
+def schedule_backfill(author_id):
+    """Поставить заполнение лент в фоновый поток после коммита."""
+    transaction.on_commit(
+        lambda: _executor.submit(_run_backfill, author_id))
+
+
+def follow_changed(user, author_ids, sign):
+    """Дополнить или очистить ленту после подписки или отписки."""
+    if sign > 0:
+        User.objects.filter(
+            pk__in=author_ids,
+            followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).exclude(
+            feed_state=FeedState.POPULAR
+        ).update(feed_state=FeedState.POPULAR)
+        fanout_ids = list(User.objects.filter(
+            pk__in=author_ids
+        ).exclude(
+            feed_state=FeedState.POPULAR
+        ).values_list('pk', flat=True))
+        if fanout_ids:
+            add_entries([user.pk], latest_recipes(fanout_ids))
+        return
+    TimelineEntry.objects.filter(
+        user=user, author_id__in=author_ids).delete()
+    # Автор перестал быть популярным: дальше его рецепты читаются
+    # только из лент, поэтому их нужно заполнить.
+    for pk in User.objects.filter(
+        needs_backfill(), pk__in=author_ids
+    ).values_list('pk', flat=True):
+        schedule_backfill(pk)
+
+
+def feed_queryset(user):
+    """Рецепты из ленты пользователя и популярных авторов, на которых
+    он подписан."""
+    popular_ids = list(
+        Follow.objects.filter(user=user).exclude(
+            author__feed_state=FeedState.FANOUT
+        ).values_list('author_id', flat=True))
+    if not popular_ids:
+        return Recipe.objects.filter(timeline_entries__user=user)
+    return Recipe.objects.filter(
+        Q(Exists(TimelineEntry.objects.filter(
+            user=user, recipe_id=OuterRef('pk'))))
+        | Q(author_id__in=popular_ids))
@@ -1,17 +1,21 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from api.models import Recipe, Tag
-from users.models import User
+from api.catalogs import tag_slugs
+from api.models import Recipe
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in tag_slugs.get()]
 
 
 class RecipeFilter(filters.FilterSet):
-    author = filters.ModelChoiceFilter(
-        queryset=User.objects.all()
+    author = filters.NumberFilter(
+        field_name='author_id'
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags'
     )
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited'
@@ -20,15 +24,28 @@ class RecipeFilter(filters.FilterSet):
         method='filter_is_in_shopping_cart'
     )
 
+    def filter_tags(self, queryset, name, slugs):
+        """Рецепты хотя бы с одним из тэгов, без JOIN и DISTINCT."""
+        ids = tag_slugs.get()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag_id__in=[ids[slug] for slug in slugs if slug in ids])))
+
     def filter_is_favorited(self, queryset, name, value):
-        if value:
-            return queryset.filter(is_favorited=True)
-        return queryset
+        if not value:
+            return queryset
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.favorited_by(user)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            queryset = queryset.filter(is_in_shopping_cart=True)
-        return queryset
+        if not value:
+            return queryset
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.in_shopping_cart_of(user)
 
     class Meta:
         model = Recipe
@@ -0,0 +1,33 @@
+from django.core.cache import caches
+
+fragment_cache = caches['recipes']
+FRAGMENT_KEY = 'recipe:{}:{}:{}'
+
+
+def get_fragment_key(recipe, request):
+    """Ключ представления рецепта.
+
+    Версия рецепта увеличивается при любом изменении, влияющем на
+    представление, поэтому старые записи просто перестают читаться.
+    Адрес сайта входит в ключ, так как ссылки на изображения абсолютные."""
+    base_url = request.build_absolute_uri('/') if request is not None else ''
+    return FRAGMENT_KEY.format(recipe.pk, recipe.cache_version, base_url)
+
+
+def get_fragments(recipes, request, render):
+    """Представления рецептов одним обращением к кэшу.
+
+    Отсутствующие в кэше представления строятся функцией render для
+    списка рецептов и сохраняются. Возвращает словарь {id: представление}."""
+    keys = {recipe.pk: get_fragment_key(recipe, request) for recipe in recipes}
+    cached = fragment_cache.get_many(keys.values())
+    fragments = {
+        pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [recipe for recipe in recipes if recipe.pk not in fragments]
+    if missing:
+        rendered = {}
+        for recipe, fragment in zip(missing, render(missing)):
+            fragments[recipe.pk] = fragment
+            rendered[keys[recipe.pk]] = fragment
+        fragment_cache.set_many(rendered)
+    return fragments
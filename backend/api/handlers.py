@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.base import BaseHandler
+from django.db import close_old_connections
+
+from api.signals import check_connections
+
+# Сколько частей потокового ответа ждут отправки клиенту.
+STREAM_QUEUE_SIZE = 8
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASGI_THREADS, thread_name_prefix='asgi')
+
+
+class ResponseStream:
+    """Передача потокового ответа из потока пула в цикл событий.
+
+    Части ответа читает тот же поток, в котором выполнялось
+    представление: соединения с базой принадлежат потоку, а генератор
+    ответа обращается к базе. Очередь частей ограничена, поэтому поток
+    ждёт медленного клиента и ответ не собирается в памяти целиком."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.response = loop.create_future()
+        self.parts = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.closed = False
+        self.task = None
+
+    def put(self, part):
+        """Передать часть ответа, вызывается из потока пула."""
+        asyncio.run_coroutine_threadsafe(
+            self.parts.put(part), self.loop).result()
+
+    def feed(self, response):
+        """Прочитать ответ в потоке пула, None - конец ответа."""
+        self.loop.call_soon_threadsafe(self.response.set_result, response)
+        try:
+            for part in response:
+                if self.closed:
+                    break
+                self.put(part)
+        finally:
+            try:
+                if not self.closed:
+                    self.put(None)
+            finally:
+                response.close()
+
+    def close(self):
+        """Клиент больше не читает ответ: освободить поток пула."""
+        self.closed = True
+        while not self.parts.empty():
+            self.parts.get_nowait()
+
+
+def get_response(handler, request, stream):
+    """Обработать запрос в потоке executor.
+
+    Соединения с базой в потоке проверяются и закрываются так же,
+    как в начале и в конце запроса под WSGI, у потокового ответа -
+    после отправки последней части."""
+    close_old_connections()
+    check_connections()
+    try:
+        response = handler.get_response(request)
+        if not response.streaming:
+            return response
+        response.asgi_stream = stream
+        stream.feed(response)
+    finally:
+        close_old_connections()
+
+
+def get_response_headers(response):
+    headers = [
+        (
+            header.encode('ascii') if isinstance(header, str) else header,
+            value.encode('latin1') if isinstance(value, str) else value,
+        )
+        for header, value in response.items()
+    ]
+    headers.extend(
+        (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+        for cookie in response.cookies.values())
+    return headers
+
+
+class ThreadPoolASGIHandler(ASGIHandler):
+    """ASGI-обработчик, выполняющий middleware и представления в пуле потоков.
+
+    Цикл событий принимает тела запросов и отправляет ответы, поэтому
+    медленные клиенты не занимают потоки. Стандартный обработчик
+    Django 3.2 выполняет каждый синхронный middleware и представление
+    в одном общем потоке процесса, и запросы ждут друг друга."""
+
+    def __init__(self):
+        BaseHandler.__init__(self)
+        self.load_middleware()
+
+    async def get_response_async(self, request):
+        loop = asyncio.get_running_loop()
+        stream = ResponseStream(loop)
+        call = functools.partial(
+            contextvars.copy_context().run,
+            get_response, self, request, stream)
+        stream.task = loop.run_in_executor(executor, call)
+        await asyncio.wait(
+            (stream.task, stream.response),
+            return_when=asyncio.FIRST_COMPLETED)
+        if stream.response.done():
+            return stream.response.result()
+        return stream.task.result()
+
+    async def send_response(self, response, send):
+        stream = getattr(response, 'asgi_stream', None)
+        if stream is None:
+            return await super().send_response(response, send)
+        # Django 3.2 читает потоковый ответ прямо в цикле событий, здесь
+        # части приходят из потока пула по мере готовности.
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': get_response_headers(response),
+            })
+            while True:
+                part = await stream.parts.get()
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            stream.close()
+            await stream.task
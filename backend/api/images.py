@@ -0,0 +1,119 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import F
+from PIL import Image
+from rest_framework import serializers
+
+from api.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Название варианта: максимальные ширина и высота.
+IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+# Формат: расширение файла, формат Pillow и параметры сохранения.
+IMAGE_FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 85, 'optimize': True}),
+}
+VARIANTS_DIR = 'img/variants'
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_VARIANT_WORKERS,
+    thread_name_prefix='image-variants')
+
+
+def _flatten(image):
+    """Изображение в RGB, прозрачность заливается белым."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def build_variants(name):
+    """Сохранить уменьшенные копии изображения во всех форматах.
+
+    Возвращает описание вариантов для поля Recipe.image_variants."""
+    with default_storage.open(name) as file:
+        source = _flatten(Image.open(file))
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    variants = {'source': name}
+    for variant, size in IMAGE_VARIANTS.items():
+        image = source.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        variants[variant] = {}
+        for image_format, (ext, pil_format, options) in IMAGE_FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, pil_format, **options)
+            variants[variant][image_format] = default_storage.save(
+                f'{VARIANTS_DIR}/{stem}_{variant}.{ext}',
+                ContentFile(buffer.getvalue()))
+    return variants
+
+
+def generate_recipe_variants(recipe_id):
+    """Подготовить варианты изображения рецепта, если они устарели."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_variants').first()
+    if recipe is None or not recipe.has_stale_variants:
+        return False
+    variants = build_variants(recipe.image.name)
+    # Изображение могло смениться, пока готовились варианты.
+    return bool(Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(
+        image_variants=variants, cache_version=F('cache_version') + 1))
+
+
+def _run(recipe_id):
+    try:
+        generate_recipe_variants(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить изображения рецепта %s', recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe_id):
+    """Поставить подготовку вариантов в фоновый поток после коммита."""
+    transaction.on_commit(lambda: _executor.submit(_run, recipe_id))
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения рецепта.
+
+    Пока копии не готовы, отдаётся пустой словарь и клиент
+    использует исходное изображение."""
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if recipe.has_stale_variants:
+            return {}
+        request = self.context.get('request')
+        result = {}
+        for variant in IMAGE_VARIANTS:
+            result[variant] = {}
+            names = recipe.image_variants.get(variant, {})
+            for image_format, name in names.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                result[variant][image_format] = url
+        return result
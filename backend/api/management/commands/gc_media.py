@@ -0,0 +1,87 @@
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Recipe
+
+
+def iter_files(root, min_age):
+    """Файлы каталога root (пути относительно MEDIA_ROOT) старше min_age."""
+    deadline = time.time() - min_age
+    directories = [root]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif (
+                    entry.is_file(follow_symlinks=False)
+                    and entry.stat().st_mtime < deadline
+                ):
+                    yield (
+                        os.path.relpath(entry.path, settings.MEDIA_ROOT)
+                        .replace(os.sep, '/'),
+                        entry.stat().st_size,
+                    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Поиск файлов в MEDIA_ROOT, на которые не ссылается ни один рецепт. '
+        'Без --delete только выводит отчёт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Удалить найденные файлы.')
+        parser.add_argument(
+            '--path', default='img',
+            help='Каталог внутри MEDIA_ROOT для проверки.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе указанного числа секунд.')
+
+    def handle(self, *args, **options):
+        root = os.path.join(settings.MEDIA_ROOT, options['path'])
+        if not os.path.isdir(root):
+            raise CommandError(f'Каталог {root} не найден.')
+        variants = self.get_variant_names()
+        files = iter_files(root, options['min_age'])
+        checked = orphans = orphan_bytes = 0
+        while True:
+            batch = dict(islice(files, options['batch_size']))
+            if not batch:
+                break
+            checked += len(batch)
+            referenced = set(
+                Recipe.objects.filter(
+                    image__in=batch
+                ).values_list('image', flat=True))
+            for name, size in batch.items():
+                if name in referenced or name in variants:
+                    continue
+                orphans += 1
+                orphan_bytes += size
+                if options['delete']:
+                    default_storage.delete(name)
+                else:
+                    self.stdout.write(name)
+        action = 'Удалено' if options['delete'] else 'Найдено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено файлов: {checked}. {action} неиспользуемых: '
+            f'{orphans} ({orphan_bytes / 1024 / 1024:.1f} МБ).'))
+
+    def get_variant_names(self):
+        """Имена всех уменьшенных копий, на которые ссылаются рецепты."""
+        names = set()
+        for variants in Recipe.objects.values_list(
+                'image_variants', flat=True).iterator():
+            for formats in (variants or {}).values():
+                if isinstance(formats, dict):
+                    names.update(formats.values())
+        return names
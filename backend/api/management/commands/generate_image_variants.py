@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from api.images import build_variants
+from api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Подготовка уменьшенных копий изображений существующих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать копии, даже если они актуальны.')
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        recipes = Recipe.objects.only('image', 'image_variants').order_by('id')
+        for recipe in recipes.iterator():
+            if not recipe.image:
+                continue
+            if not options['force'] and not recipe.has_stale_variants:
+                continue
+            try:
+                variants = build_variants(recipe.image.name)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(
+                    f'Рецепт {recipe.pk} ({recipe.image.name}): {error}')
+                continue
+            Recipe.objects.filter(
+                pk=recipe.pk, image=recipe.image.name
+            ).update(
+                image_variants=variants,
+                cache_version=F('cache_version') + 1)
+            done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Подготовлены копии для {done} рецептов, ошибок: {failed}.'))
@@ -0,0 +1,133 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.catalogs import bump_version
+from api.models import Ingredient
+
+# Папка data рядом с backend, в контейнере она подключена как /data.
+DEFAULT_PATH = Path(settings.BASE_DIR).parent / 'data' / 'ingredients.csv'
+CHUNK_SIZE = 64 * 1024
+FIELDS = ('name', 'measurement_unit')
+
+
+def read_csv(file):
+    """Построчное чтение CSV, заголовок name,measurement_unit необязателен."""
+    for row in csv.reader(file):
+        if tuple(row) == FIELDS:
+            continue
+        yield dict(zip(FIELDS, row))
+
+
+def read_json(file):
+    """Потоковое чтение JSON-массива объектов без загрузки файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив ингредиентов.')
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip(', \t\r\n')
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Файл JSON оборван или повреждён.')
+            chunk = file.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        if isinstance(item, dict):
+            yield item
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = 'Загрузка каталога ингредиентов из CSV или JSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=str(DEFAULT_PATH),
+            help=f'Путь к файлу (по умолчанию {DEFAULT_PATH}).')
+        parser.add_argument(
+            '--format', choices=READERS, default=None,
+            help='Формат файла, по умолчанию определяется по расширению.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одной вставке.')
+        parser.add_argument('--encoding', default='utf-8')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла: {path.name}. '
+                f'Укажите --format {"|".join(READERS)}.')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        self.name_length = Ingredient._meta.get_field('name').max_length
+        self.unit_length = Ingredient._meta.get_field(
+            'measurement_unit').max_length
+        self.seen = set()
+        self.total = self.skipped = 0
+
+        started = time.monotonic()
+        before = Ingredient.objects.count()
+        try:
+            with open(path, encoding=options['encoding'], newline='') as file:
+                ingredients = self.clean(READERS[file_format](file))
+                with transaction.atomic():
+                    while True:
+                        batch = list(islice(ingredients, batch_size))
+                        if not batch:
+                            break
+                        Ingredient.objects.bulk_create(
+                            batch, ignore_conflicts=True)
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        created = Ingredient.objects.count() - before
+        if created:
+            bump_version('ingredients')
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {self.total}, добавлено: {created}, '
+            f'уже были в базе: {self.total - self.skipped - created}, '
+            f'пропущено: {self.skipped}. '
+            f'{elapsed:.2f} с, {self.total / max(elapsed, 1e-6):.0f} строк/с.'
+        ))
+
+    def clean(self, rows):
+        """Проверка строк и отбрасывание дублей по unique_ingredient."""
+        for row in rows:
+            self.total += 1
+            name = str(row.get('name') or '').strip()
+            unit = str(row.get('measurement_unit') or '').strip()
+            key = (name, unit)
+            if (
+                not name or not unit
+                or len(name) > self.name_length
+                or len(unit) > self.unit_length
+                or key in self.seen
+            ):
+                self.skipped += 1
+                continue
+            self.seen.add(key)
+            yield Ingredient(name=name, measurement_unit=unit)
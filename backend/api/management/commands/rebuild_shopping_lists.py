@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from api.models import Amount, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт списков покупок по корзинам с нуля и сверка '
+        'с сохранёнными итогами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только показать расхождения, не исправляя их.')
+
+    def handle(self, *args, **options):
+        expected = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in Amount.objects.filter(
+                recipe__shopping_cart__isnull=False
+            ).values_list(
+                'recipe__shopping_cart__user_id', 'ingredient_id'
+            ).annotate(total=Sum('amount')).order_by().iterator()
+        }
+        current = {
+            (user_id, ingredient_id): (pk, amount)
+            for pk, user_id, ingredient_id, amount in (
+                ShoppingListItem.objects.values_list(
+                    'pk', 'user_id', 'ingredient_id', 'amount').iterator())
+        }
+        missing = [
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=total)
+            for (user_id, ingredient_id), total in expected.items()
+            if (user_id, ingredient_id) not in current
+        ]
+        extra = [
+            pk for key, (pk, _) in current.items() if key not in expected]
+        wrong = [
+            ShoppingListItem(pk=pk, amount=expected[key])
+            for key, (pk, amount) in current.items()
+            if key in expected and expected[key] != amount
+        ]
+        for item in missing:
+            self.stdout.write(
+                f'Нет записи: пользователь {item.user_id}, '
+                f'ингредиент {item.ingredient_id}, должно быть {item.amount}')
+        for item in wrong:
+            self.stdout.write(
+                f'Неверное количество в записи {item.pk}: '
+                f'должно быть {item.amount}')
+        if extra:
+            self.stdout.write(f'Лишние записи: {extra}')
+        if not options['check']:
+            with transaction.atomic():
+                ShoppingListItem.objects.filter(pk__in=extra).delete()
+                ShoppingListItem.objects.bulk_create(missing, batch_size=1000)
+                ShoppingListItem.objects.bulk_update(
+                    wrong, ('amount',), batch_size=1000)
+        action = 'Найдено' if options['check'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} расхождений: отсутствующих {len(missing)}, '
+            f'лишних {len(extra)}, неверных {len(wrong)}.'))
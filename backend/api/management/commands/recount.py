@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+# Модель со счётчиком, поле счётчика, считаемая модель и её внешний ключ.
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def count_related(model, field):
+    """Подзапрос с количеством связанных записей для каждой строки."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт счётчиков избранного, корзин, рецептов и подписчиков '
+        'и исправление расхождений.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только показать расхождения, не исправляя их.')
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, counter, related, field in COUNTERS:
+            with transaction.atomic():
+                expected = count_related(related, field)
+                drifted = list(
+                    model.objects.annotate(expected=expected).exclude(
+                        **{counter: F('expected')}
+                    ).values_list('pk', flat=True))
+                if drifted and not options['check']:
+                    model.objects.filter(pk__in=drifted).update(
+                        **{counter: expected})
+            total += len(drifted)
+            self.stdout.write(
+                f'{model._meta.model_name}.{counter}: '
+                f'расхождений {len(drifted)}')
+        action = 'Найдено' if options['check'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} расхождений: {total}.'))
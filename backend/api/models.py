@@ -1,7 +1,8 @@
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import Case, F, Sum, Value, When
 
-from users.models import User
+from users.models import CounterFieldsMixin, User
 
 
 class Tag(models.Model):
@@ -53,24 +54,20 @@ class Ingredient(models.Model):
 
 
 class RecipeQuerySet(models.QuerySet):
-    def add_user_annotations(self, user_id):
-        return self.annotate(
-            is_favorited=models.Exists(
-                Favorite.objects.filter(
-                    user=user_id,
-                    recipe__pk=models.OuterRef('pk')
-                )
-            ),
-            is_in_shopping_cart=models.Exists(
-                ShoppingCart.objects.filter(
-                    user__id=user_id,
-                    recipe__pk=models.OuterRef('pk')
-                )
-            )
-        )
+    def favorited_by(self, user):
+        return self.filter(
+            id__in=Favorite.objects.filter(user=user).values('recipe_id'))
+
+    def in_shopping_cart_of(self, user):
+        return self.filter(
+            id__in=ShoppingCart.objects.filter(user=user).values('recipe_id'))
 
+    def bump_cache_version(self):
+        """Сделать устаревшими закэшированные представления рецептов."""
+        return self.update(cache_version=F('cache_version') + 1)
 
-class Recipe(models.Model):
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         related_name='recipes',
@@ -85,6 +82,11 @@ class Recipe(models.Model):
         null=False,
         blank=False,
         verbose_name='Изображение')
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения')
     text = models.TextField(
         'Описание рецепта'
     )
@@ -104,8 +106,22 @@ class Recipe(models.Model):
                 message='Время приготовления должно быть больше минуты'),
         ]
     )
+    favorites_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном')
+    shopping_carts_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах')
+    cache_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Версия закэшированного представления')
 
     objects = RecipeQuerySet.as_manager()
+    counter_fields = (
+        'favorites_count', 'shopping_carts_count', 'cache_version')
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -114,6 +130,11 @@ class Recipe(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def has_stale_variants(self):
+        """Уменьшенные копии не готовы или сделаны из другого изображения."""
+        return (self.image_variants or {}).get('source') != self.image.name
+
 
 class Amount(models.Model):
     recipe = models.ForeignKey(
@@ -175,6 +196,12 @@ class Favorite(models.Model):
             f'Пользователь "{self.user}"'
             f' добавил "{self.recipe}" в Избранные.')
 
+    @classmethod
+    def on_toggle(cls, user, recipe_ids, sign):
+        """Обновление счётчика добавлений рецептов в избранное."""
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            favorites_count=F('favorites_count') + sign)
+
 
 class ShoppingCart(models.Model):
     user = models.ForeignKey(
@@ -201,3 +228,145 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Пользователь "{self.user}" добавил "{self.recipe}" в покупки.'
+
+    @classmethod
+    def on_toggle(cls, user, recipe_ids, sign):
+        """Пересчёт списка покупок и счётчика корзин
+        после добавления или удаления рецептов."""
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            shopping_carts_count=F('shopping_carts_count') + sign)
+        ShoppingListItem.objects.apply_recipes([user.pk], recipe_ids, sign)
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавить изменения количеств ингредиентов к итогам пользователей.
+
+        deltas - словарь {id ингредиента: изменение количества}."""
+        user_ids = list(user_ids)
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta}
+        if not user_ids or not deltas:
+            return
+        connection = connections[router.db_for_write(self.model)]
+        items = self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+        with transaction.atomic(using=connection.alias):
+            if connection.vendor == 'postgresql':
+                self.upsert(connection, user_ids, deltas)
+            else:
+                # Существующие строки блокируются до вставки, чтобы
+                # параллельный запрос не удалил их до изменения.
+                list(items.select_for_update().values_list('pk'))
+                self.bulk_create(
+                    (
+                        ShoppingListItem(
+                            user_id=user_id, ingredient_id=ingredient_id)
+                        for user_id in user_ids
+                        for ingredient_id, delta in deltas.items()
+                        if delta > 0
+                    ),
+                    ignore_conflicts=True)
+                items.update(amount=F('amount') + Case(
+                    *(
+                        When(ingredient_id=ingredient_id, then=Value(delta))
+                        for ingredient_id, delta in deltas.items()
+                    ),
+                    default=Value(0)))
+            items.filter(amount__lte=0).delete()
+
+    def upsert(self, connection, user_ids, deltas):
+        """Вставка и изменение итогов одним запросом PostgreSQL."""
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                f'SELECT user_id, ingredient_id, delta '
+                f'FROM unnest(%s::bigint[]) AS users (user_id) '
+                f'CROSS JOIN unnest(%s::bigint[], %s::integer[]) '
+                f'AS deltas (ingredient_id, delta) '
+                f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                f'SET amount = {table}.amount + EXCLUDED.amount',
+                [user_ids, list(deltas), list(deltas.values())])
+
+    def apply_recipes(self, user_ids, recipe_ids, sign=1):
+        """Добавить (sign=1) или убрать (sign=-1) рецепты из итогов."""
+        totals = Amount.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id').annotate(total=Sum('amount'))
+        self.apply_deltas(
+            user_ids,
+            {ingredient_id: sign * total for ingredient_id, total in totals})
+
+
+class ShoppingListItem(models.Model):
+    """Итоговое количество ингредиента в корзине пользователя.
+
+    Обновляется при изменении корзины и состава рецептов в ней."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент')
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество')
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт автора в ленте подписчика.
+
+    Заполняется при публикации рецепта и при подписке. Рецепты авторов,
+    у которых подписчиков стало больше FEED_FANOUT_LIMIT, в ленты
+    не попадают и подмешиваются при чтении (User.feed_state)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик')
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry'),
+        )
+        indexes = (
+            models.Index(
+                fields=['user', '-recipe'],
+                name='timeline_user_recipe_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
@@ -1,6 +1,106 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def estimate_count(queryset):
+    """Оценка числа строк запроса планировщиком PostgreSQL.
+
+    Для запроса без фильтров это reltuples таблицы, для остальных -
+    оценка с учётом статистики по условиям. На других СУБД - None."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedPage(Page):
+    def has_next(self):
+        # Оценка количества неточна, поэтому следующая страница
+        # предполагается, пока текущая заполнена целиком.
+        return len(self.object_list) == self.paginator.per_page
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator с приблизительным количеством объектов.
+
+    Точный COUNT выполняется, только если оценка меньше
+    PAGINATION_ESTIMATE_THRESHOLD."""
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or (
+                estimate < settings.PAGINATION_ESTIMATE_THRESHOLD):
+            return self.object_list.count()
+        return estimate
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        return super().validate_number(1) if number < 1 else number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
+
+
+class CursorLimitPagination(CursorPagination):
+    """Пагинация по курсору без подсчёта общего количества.
+
+    Порядок задаётся атрибутом cursor_ordering представления
+    и должен идти по уникальному индексированному полю."""
+    page_size_query_param = 'limit'
+    max_page_size = settings.MAX_PAGE_SIZE
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
 
 
 class PageLimitPagination(PageNumberPagination):
-    """Переопределение параметра размера страницы."""
+    """Переопределение параметра размера страницы.
+
+    С параметром cursor (для первой страницы - пустым) переключается
+    на пагинацию по курсору."""
     page_size_query_param = 'limit'
+    max_page_size = settings.MAX_PAGE_SIZE
+    cursor_pagination_class = CursorLimitPagination
+
+    @property
+    def django_paginator_class(self):
+        if settings.PAGINATION_COUNT == 'estimate':
+            return EstimatedCountPaginator
+        return Paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_pagination = None
+        if self.cursor_pagination_class.cursor_query_param in (
+                request.query_params):
+            self.cursor_pagination = self.cursor_pagination_class()
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
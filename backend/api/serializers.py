@@ -1,9 +1,17 @@
 import base64
 
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import models, transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
 from rest_framework import serializers
 
-from api.models import Amount, Ingredient, Recipe, Tag
+from api.fragments import get_fragments
+from api.images import ImageVariantsField
+from api.models import (Amount, Ingredient, Recipe, ShoppingCart,
+                        ShoppingListItem, Tag)
+from api.viewer import ViewerFlagsMixin, ViewerListSerializer
+from users.models import User
 from users.serializers import UserListOrDetailSerializer
 
 
@@ -47,17 +55,96 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+def get_objects_by_pks(queryset, pks):
+    """Получить объекты по списку первичных ключей одним запросом.
+
+    Сообщает сразу обо всех несуществующих ключах."""
+    objects = queryset.in_bulk(set(pks))
+    missing = sorted(set(pks) - objects.keys())
+    if missing:
+        raise serializers.ValidationError(
+            'Недопустимые первичные ключи '
+            f'{", ".join(map(str, missing))} - объекты не существуют.')
+    return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.ListField):
+    """Список первичных ключей, которые проверяются одним запросом."""
+    child = serializers.IntegerField(min_value=1)
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        pks = list(dict.fromkeys(super().to_internal_value(data)))
+        return get_objects_by_pks(self.queryset.all(), pks)
+
+    def to_representation(self, value):
+        return [item.pk for item in value.all()]
+
+
+class AuthorProfileSerializer(serializers.ModelSerializer):
+    """Данные автора, одинаковые для всех пользователей."""
+    class Meta:
+        model = User
+        fields = (
+            'email',
+            'id',
+            'username',
+            'first_name',
+            'last_name',
+        )
+
+
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """Часть представления рецепта, не зависящая от пользователя.
+
+    Хранится в кэше recipes до изменения версии рецепта."""
+    tags = TagSerializer(read_only=True, many=True)
+    ingredients = AmountSerializer(many=True, source='recipe')
+    author = AuthorProfileSerializer()
+    image_variants = ImageVariantsField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            "id",
+            "tags",
+            "author",
+            "ingredients",
+            "name",
+            "image",
+            "image_variants",
+            "text",
+            "cooking_time")
+
+
+class RecipeListSerializer(ViewerListSerializer):
+    """Достаёт из кэша представления всех рецептов страницы сразу."""
+    def to_representation(self, data):
+        items = list(
+            data.all() if isinstance(data, models.Manager) else data)
+        self.child.fragments = self.child.get_fragments(items)
+        return super().to_representation(items)
+
+
+class RecipeSerializer(ViewerFlagsMixin, serializers.ModelSerializer):
     """Сериализатор для отображения рецепта
-    при получении списка рецептов и конкретного рецепта."""
+    при получении списка рецептов и конкретного рецепта.
+
+    Общая часть берётся из кэша (RecipeFragmentSerializer), к ней
+    добавляются флаги текущего пользователя и счётчики."""
     tags = TagSerializer(read_only=True, many=True)
     ingredients = AmountSerializer(many=True, source='recipe')
     author = UserListOrDetailSerializer()
-    is_favorited = serializers.BooleanField()
-    is_in_shopping_cart = serializers.BooleanField()
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeListSerializer
         fields = (
             "id",
             "tags",
@@ -65,11 +152,63 @@ class RecipeSerializer(serializers.ModelSerializer):
             "ingredients",
             "is_favorited",
             "is_in_shopping_cart",
+            "favorites_count",
+            "shopping_carts_count",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time")
 
+    def prime_viewer(self, viewer, recipes):
+        recipe_ids = [recipe.pk for recipe in recipes]
+        viewer.prime('favorite', recipe_ids)
+        viewer.prime('shopping_cart', recipe_ids)
+        viewer.prime('following', (recipe.author_id for recipe in recipes))
+
+    def get_is_favorited(self, recipe):
+        return self.viewer.is_favorited(recipe.pk)
+
+    def get_is_in_shopping_cart(self, recipe):
+        return self.viewer.is_in_shopping_cart(recipe.pk)
+
+    def render_fragments(self, recipes):
+        prefetch_related_objects(
+            recipes,
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=Amount.objects.select_related('ingredient')))
+        return RecipeFragmentSerializer(
+            recipes, many=True, context=self.context).data
+
+    def get_fragments(self, recipes):
+        return get_fragments(
+            recipes, self.context.get('request'), self.render_fragments)
+
+    def to_representation(self, recipe):
+        fragments = getattr(self, 'fragments', None) or {}
+        fragment = fragments.get(recipe.pk)
+        if fragment is None:
+            fragment = self.get_fragments([recipe])[recipe.pk]
+        author = recipe.author
+        personal = {
+            'author': {
+                **fragment['author'],
+                'is_subscribed': self.viewer.is_subscribed(author.pk),
+                'recipes_count': author.recipes_count,
+                'followers_count': author.followers_count,
+            },
+            'is_favorited': self.get_is_favorited(recipe),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(recipe),
+            'favorites_count': recipe.favorites_count,
+            'shopping_carts_count': recipe.shopping_carts_count,
+        }
+        return {
+            field: personal[field] if field in personal else fragment[field]
+            for field in self.Meta.fields
+        }
+
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения данных
@@ -88,18 +227,28 @@ class RecipeShortSerializer(serializers.ModelSerializer):
             "cooking_time")
 
 
+class IngredientRecipeListSerializer(serializers.ListSerializer):
+    """Проверка всех ингредиентов рецепта одним запросом."""
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = get_objects_by_pks(
+            Ingredient.objects.all(),
+            [item['ingredient'] for item in items])
+        for item, ingredient in zip(items, ingredients):
+            item['ingredient'] = ingredient
+        return items
+
+
 class IngredientRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор получаемых ингредиентов
     при создании и обновлении рецепта."""
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient',
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(source='ingredient', min_value=1)
     amount = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = Amount  # Intermediate model
         fields = ('id', 'amount')
+        list_serializer_class = IngredientRecipeListSerializer
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -107,6 +256,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=True, allow_null=False)
     author = UserListOrDetailSerializer(read_only=True)
     ingredients = IngredientRecipeSerializer(many=True)
+    tags = BulkPrimaryKeyRelatedField(
+        queryset=Tag.objects.all(), allow_empty=False)
 
     class Meta:
         model = Recipe
@@ -122,43 +273,89 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         if len(ingredients) < 1:
             raise serializers.ValidationError(
                 'Должен присутствовать минимум один ингредиент')
-        list_of_ingredients = []
-        for current_item in ingredients:
-            if current_item['ingredient'] in list_of_ingredients:
-                raise serializers.ValidationError(
-                    ('Ингредиент в рецепте должен'
-                     ' встречаться не более одного раза.'))
-            list_of_ingredients.append(current_item['ingredient'])
+        unique_ingredients = {
+            current_item['ingredient'].pk for current_item in ingredients}
+        if len(unique_ingredients) != len(ingredients):
+            raise serializers.ValidationError(
+                ('Ингредиент в рецепте должен'
+                 ' встречаться не более одного раза.'))
         return ingredients
 
     def create_ingredients(self, ingredients, recipe):
         """Создание списка ингредиентов с количествами"""
-        for current_ingredient in ingredients:
-            Amount.objects.create(
+        Amount.objects.bulk_create(
+            Amount(
                 recipe=recipe,
                 ingredient=current_ingredient['ingredient'],
                 amount=current_ingredient['amount'])
+            for current_ingredient in ingredients)
+
+    def update_ingredients(self, ingredients, recipe):
+        """Изменение только добавленных, удалённых и изменённых количеств."""
+        current = {
+            amount.ingredient_id: amount for amount in recipe.recipe.all()}
+        new_amounts = []
+        changed_amounts = []
+        deltas = {}
+        for current_ingredient in ingredients:
+            ingredient = current_ingredient['ingredient']
+            amount = current.pop(ingredient.pk, None)
+            if amount is None:
+                new_amounts.append(Amount(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=current_ingredient['amount']))
+                deltas[ingredient.pk] = current_ingredient['amount']
+            elif amount.amount != current_ingredient['amount']:
+                deltas[ingredient.pk] = (
+                    current_ingredient['amount'] - amount.amount)
+                amount.amount = current_ingredient['amount']
+                changed_amounts.append(amount)
+        if current:
+            # Удалённые количества вычитает из списков покупок
+            # обработчик post_delete.
+            Amount.objects.filter(
+                pk__in=[amount.pk for amount in current.values()]
+            ).delete()
+        if changed_amounts:
+            Amount.objects.bulk_update(changed_amounts, ('amount',))
+        if new_amounts:
+            Amount.objects.bulk_create(new_amounts)
+        if deltas:
+            ShoppingListItem.objects.apply_deltas(
+                ShoppingCart.objects.filter(
+                    recipe=recipe).values_list('user_id', flat=True),
+                deltas)
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            recipe.ingredients.clear()
-            self.create_ingredients(ingredients, recipe)
+            self.update_ingredients(
+                validated_data.pop('ingredients'), recipe)
         if 'tags' in validated_data:
             recipe.tags.set(
                 validated_data.pop('tags'))
         return super().update(
             recipe, validated_data)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe: Recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        User.objects.filter(pk=recipe.author_id).update(
+            recipes_count=F('recipes_count') + 1)
         return recipe
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=Amount.objects.select_related('ingredient')))
         return RecipeShortSerializer(
             instance,
             context={
@@ -166,13 +363,24 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             }).data
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    """Список идентификаторов для пакетного добавления или удаления."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_IDS)
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     """Класс для отображения рецепта при добавлении в Избранное или Корзину"""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
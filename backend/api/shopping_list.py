@@ -0,0 +1,99 @@
+import csv
+import json
+import os
+from datetime import datetime as dt
+from io import BytesIO
+
+from django.conf import settings
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+FOOTER = 'Посчитано в Foodgram'
+
+
+def get_title(user):
+    return f'Список покупок для пользователя: {user.first_name}'
+
+
+def render_txt(user, ingredients):
+    yield (
+        f'{get_title(user)}\n'
+        f'{dt.now().strftime("%H:%M  %m.%d.%Y")}\n\n')
+    for ing in ingredients:
+        yield (
+            f'{ing["shop_ingredient"]}: {ing["amount"]}'
+            f' {ing["shop_measure"]}\n')
+    yield f'\n\n{FOOTER}'
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанную строку."""
+    def write(self, value):
+        return value
+
+
+def render_csv(user, ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ing in ingredients:
+        yield writer.writerow(
+            (ing['shop_ingredient'], ing['shop_measure'], ing['amount']))
+
+
+def render_json(user, ingredients):
+    yield (
+        '{"user": ' + json.dumps(user.username, ensure_ascii=False)
+        + ', "created": ' + json.dumps(dt.now().isoformat())
+        + ', "ingredients": [')
+    separator = ''
+    for ing in ingredients:
+        yield separator + json.dumps({
+            'name': ing['shop_ingredient'],
+            'measurement_unit': ing['shop_measure'],
+            'amount': ing['amount'],
+        }, ensure_ascii=False)
+        separator = ', '
+    yield ']}'
+
+
+def render_pdf(user, ingredients):
+    """PDF собирается постранично в памяти и отдаётся одним куском."""
+    font = 'ShoppingListFont'
+    if font not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(font, settings.SHOPPING_LIST_PDF_FONT))
+    buffer = BytesIO()
+    page = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    lines = [get_title(user), dt.now().strftime('%H:%M  %m.%d.%Y'), '']
+    lines += (
+        f'{ing["shop_ingredient"]}: {ing["amount"]} {ing["shop_measure"]}'
+        for ing in ingredients)
+    lines += ['', FOOTER]
+    top = height - 50
+    position = top
+    page.setFont(font, 12)
+    for line in lines:
+        if position < 50:
+            page.showPage()
+            page.setFont(font, 12)
+            position = top
+        page.drawString(50, position, line)
+        position -= 18
+    page.save()
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json; charset=utf-8', render_json),
+}
+if canvas is not None and os.path.exists(settings.SHOPPING_LIST_PDF_FONT):
+    EXPORT_FORMATS['pdf'] = ('application/pdf', render_pdf)
@@ -0,0 +1,164 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_tokens
+from api.catalogs import bump_version
+from api.feed import schedule_fan_out
+from api.images import schedule_variants
+from api.models import (Amount, Ingredient, Recipe, ShoppingCart,
+                        ShoppingListItem, Tag)
+from users.models import User
+
+# Поля пользователя, входящие в закэшированное представление рецепта.
+AUTHOR_PROFILE_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Закрыть постоянные соединения, которые оборвал сервер базы.
+
+    Так делает CONN_HEALTH_CHECKS из Django 4.1: первый запрос к базе
+    откроет новое соединение вместо ошибки на оборванном."""
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if (
+                connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    bump_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created, **kwargs):
+    if created:
+        schedule_fan_out(instance)
+    else:
+        Recipe.objects.filter(pk=instance.pk).bump_cache_version()
+    if instance.image and instance.has_stale_variants:
+        schedule_variants(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Amount)
+def amount_changed(instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).bump_cache_version()
+
+
+def apply_amount_changes(changes):
+    """Поправить списки покупок пользователей, у которых рецепт в корзине.
+
+    changes - {(id рецепта, id ингредиента): изменение количества}."""
+    for recipe_id in {recipe_id for recipe_id, _ in changes}:
+        ShoppingListItem.objects.apply_deltas(
+            ShoppingCart.objects.filter(
+                recipe_id=recipe_id).values_list('user_id', flat=True),
+            {
+                ingredient_id: delta
+                for (changed_recipe_id, ingredient_id), delta
+                in changes.items() if changed_recipe_id == recipe_id
+            })
+
+
+@receiver(pre_save, sender=Amount)
+def amount_saving(instance, **kwargs):
+    """Запомнить прежнее количество, чтобы вычесть его из списков покупок."""
+    previous = None
+    if instance.pk is not None:
+        previous = Amount.objects.filter(pk=instance.pk).values_list(
+            'recipe_id', 'ingredient_id', 'amount').first()
+    instance.previous_amount = previous
+
+
+@receiver(post_save, sender=Amount)
+def amount_saved(instance, **kwargs):
+    changes = Counter(
+        {(instance.recipe_id, instance.ingredient_id): instance.amount})
+    previous = getattr(instance, 'previous_amount', None)
+    if previous is not None:
+        recipe_id, ingredient_id, amount = previous
+        changes[recipe_id, ingredient_id] -= amount
+    apply_amount_changes(changes)
+
+
+@receiver(post_delete, sender=Amount)
+def amount_deleted(instance, **kwargs):
+    apply_amount_changes(
+        {(instance.recipe_id, instance.ingredient_id): -instance.amount})
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(instance, **kwargs):
+    """Убрать рецепт из списков покупок до удаления его ингредиентов.
+
+    Записи корзины удаляются здесь же, поэтому удаление ингредиентов
+    рецепта списки покупок уже не меняет."""
+    carts = ShoppingCart.objects.filter(recipe=instance)
+    ShoppingListItem.objects.apply_recipes(
+        carts.values_list('user_id', flat=True), [instance.pk], -1)
+    carts.delete()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(instance, created=False, **kwargs):
+    if not created:
+        Recipe.objects.filter(tags=instance).bump_cache_version()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    elif pk_set is None:
+        recipes = Recipe.objects.filter(tags=instance)
+    else:
+        recipes = Recipe.objects.filter(pk__in=pk_set)
+    recipes.bump_cache_version()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_changed(instance, created=False, **kwargs):
+    if not created:
+        Recipe.objects.filter(ingredients=instance).bump_cache_version()
+
+
+@receiver(post_save, sender=User)
+def author_changed(instance, created, update_fields=None, **kwargs):
+    if created or (
+            update_fields and not AUTHOR_PROFILE_FIELDS & set(update_fields)):
+        return
+    Recipe.objects.filter(author=instance).bump_cache_version()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, created, **kwargs):
+    """Сбросить закэшированного пользователя: могли смениться пароль,
+    активность или данные профиля."""
+    if not created:
+        invalidate_tokens(
+            Token.objects.filter(user=instance).values_list('key', flat=True))
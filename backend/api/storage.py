@@ -0,0 +1,37 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, называющее файлы по SHA-256 содержимого.
+
+    Одинаковые загрузки сохраняются один раз и ссылаются на один файл,
+    поэтому файлы не удаляются вместе с рецептами, а собираются
+    командой gc_media."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest.hexdigest() + extension)
+        if self.exists(name):
+            # Время изменения обновляется, чтобы gc_media --min-age не
+            # удалил старый неиспользуемый файл, пока рецепт с ним
+            # ещё сохраняется.
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                pass
+            else:
+                return name
+        return super().save(name, content, max_length=max_length)
@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from api.views import (AuthCacheStatsView, IngredientViewSet, RecipeViewSet,
+                       TagViewSet)
 
 router_api = DefaultRouter()
 router_api.register('recipes', RecipeViewSet, basename='recipes')
@@ -9,6 +10,7 @@ router_api.register('tags', TagViewSet, basename='tags')
 router_api.register('ingredients', IngredientViewSet, basename='ingredients')
 
 urlpatterns = [
+    path('metrics/auth-cache/', AuthCacheStatsView.as_view()),
     path('', include(router_api.urls)),
     path('', include('users.urls')),
 ]
@@ -1,10 +1,15 @@
 from typing import Type, Union
 
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Exists, OuterRef
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 
 from api.models import Favorite, ShoppingCart
+from api.serializers import BulkIdsSerializer
 from users.models import Follow
 
 
@@ -15,38 +20,169 @@ def create_delete_obj(
         error_create_message: str,
         error_delete_message: str,
         field_to_create_or_delete: str):
-    source_object = get_object_or_404(self.get_queryset(), id=pk)
-    kwargs = {
-        'user': self.request.user,
-        field_to_create_or_delete: source_object}
+    """Добавить или удалить связь пользователя с объектом.
+
+    POST - поиск объекта и одна вставка: повторная вставка отклоняется
+    ограничением уникальности, без предварительной проверки.
+    DELETE - один DELETE, ответ выбирается по числу удалённых строк."""
+    user = self.request.user
     if self.request.method == 'POST':
-        if klass.objects.filter(**kwargs).exists():
-            response = Response(
-                {'errors ': error_create_message},
-                status=status.HTTP_400_BAD_REQUEST)
-        elif source_object == self.request.user:
+        source_object = get_object_or_404(self.get_queryset(), id=pk)
+        if source_object == user:
             """ На случай подписки на самого себя."""
-            response = Response(
+            return Response(
                 {'errors ': 'Не стоит подписываться на самого себя'},
                 status=status.HTTP_400_BAD_REQUEST)
-        else:
-            klass.objects.create(**kwargs)
-            serializer = self.get_serializer_class()
-            context = self.get_serializer_context()
-            response = Response(
-                serializer(
-                    instance=source_object,
-                    context=context).data,
-                status=status.HTTP_201_CREATED)
-    elif self.request.method == 'DELETE':
-        delete_object = klass.objects.filter(**kwargs).first()
-        if delete_object is None:
-            response = Response(
-                {'errors ': error_delete_message},
+        try:
+            with transaction.atomic():
+                klass.objects.create(
+                    user=user, **{field_to_create_or_delete: source_object})
+                klass.on_toggle(user, [source_object.pk], 1)
+        except IntegrityError:
+            return Response(
+                {'errors ': error_create_message},
                 status=status.HTTP_400_BAD_REQUEST)
-        else:
-            delete_object.delete()
-            response = Response(status=status.HTTP_204_NO_CONTENT)
+        # Счётчики объекта изменились в базе выражениями F(). Объект мог
+        # быть прочитан с реплики, поэтому значения берутся с основной базы.
+        source_object.refresh_from_db(
+            using=router.db_for_write(type(source_object)),
+            fields=source_object.counter_fields)
+        serializer = self.get_serializer_class()
+        context = self.get_serializer_context()
+        return Response(
+            serializer(
+                instance=source_object,
+                context=context).data,
+            status=status.HTTP_201_CREATED)
+    if self.request.method == 'DELETE':
+        with transaction.atomic():
+            deleted, _ = klass.objects.filter(
+                user=user, **{f'{field_to_create_or_delete}_id': pk}
+            ).delete()
+            if deleted:
+                klass.on_toggle(user, [pk], -1)
+        if deleted:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if not self.get_queryset().filter(id=pk).exists():
+            raise Http404
+        return Response(
+            {'errors ': error_delete_message},
+            status=status.HTTP_400_BAD_REQUEST)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def get_link_states(user, klass, field_name, ids):
+    """Одним запросом: {id объекта: связан ли он с пользователем}.
+
+    Несуществующих объектов в словаре нет."""
+    model = klass._meta.get_field(field_name).related_model
+    return dict(
+        model.objects.filter(pk__in=ids).annotate(
+            linked=Exists(klass.objects.filter(
+                user=user, **{field_name: OuterRef('pk')}))
+        ).values_list('pk', 'linked'))
+
+
+def insert_links(user, klass, field_name, ids):
+    """Создать связи пользователя с объектами ids, пропуская существующие.
+
+    Возвращает id объектов, для которых строка действительно вставлена:
+    по ним обновляются счётчики, даже если параллельный запрос
+    вставляет те же связи."""
+    connection = connections[router.db_for_write(klass)]
+    if connection.vendor == 'postgresql':
+        quote = connection.ops.quote_name
+        user_column = quote(klass._meta.get_field('user').column)
+        column = quote(klass._meta.get_field(field_name).column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(klass._meta.db_table)} '
+                f'({user_column}, {column}) '
+                f'SELECT %s, unnest(%s::bigint[]) '
+                f'ON CONFLICT DO NOTHING RETURNING {column}',
+                [user.pk, ids])
+            return [row[0] for row in cursor.fetchall()]
+    inserted = []
+    for pk in ids:
+        try:
+            with transaction.atomic():
+                klass.objects.create(user=user, **{f'{field_name}_id': pk})
+        except IntegrityError:
+            continue
+        inserted.append(pk)
+    return inserted
+
+
+def delete_links(user, klass, field_name, ids):
+    """Удалить связи пользователя с объектами ids.
+
+    Строки блокируются до удаления, поэтому параллельный запрос,
+    удаляющий те же связи, дождётся и не найдёт их. Возвращает id
+    объектов, связи с которыми удалены."""
+    links = list(klass.objects.filter(
+        user=user, **{f'{field_name}_id__in': ids}
+    ).select_for_update().values_list('pk', f'{field_name}_id'))
+    klass.objects.filter(pk__in=[pk for pk, _ in links]).delete()
+    return [object_id for _, object_id in links]
+
+
+def create_delete_objs(
+        self: viewsets.ModelViewSet,
+        klass: Union[Type[Favorite], Type[ShoppingCart], Type[Follow]],
+        error_create_message: str,
+        error_delete_message: str,
+        field_to_create_or_delete: str):
+    """Пакетный вариант create_delete_obj для списка ids из тела запроса.
+
+    Счётчики обновляются только по действительно вставленным или
+    удалённым строкам, в ответе для каждого id - статус, который вернул
+    бы create_delete_obj."""
+    serializer = BulkIdsSerializer(data=self.request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    user = self.request.user
+    states = get_link_states(user, klass, field_to_create_or_delete, ids)
+    errors = {
+        pk: (status.HTTP_404_NOT_FOUND, str(NotFound.default_detail))
+        for pk in ids if pk not in states}
+    if self.request.method == 'POST':
+        if isinstance(user, klass._meta.get_field(
+                field_to_create_or_delete).related_model):
+            """ На случай подписки на самого себя."""
+            errors.setdefault(user.pk, (
+                status.HTTP_400_BAD_REQUEST,
+                'Не стоит подписываться на самого себя'))
+        errors.update(
+            (pk, (status.HTTP_400_BAD_REQUEST, error_create_message))
+            for pk, linked in states.items() if linked)
+        success, sign = status.HTTP_201_CREATED, 1
     else:
-        response = Response(status=status.HTTP_204_NO_CONTENT)
-    return response
+        errors.update(
+            (pk, (status.HTTP_400_BAD_REQUEST, error_delete_message))
+            for pk, linked in states.items() if not linked)
+        success, sign = status.HTTP_204_NO_CONTENT, -1
+    changed = [pk for pk in ids if pk not in errors]
+    if changed:
+        with transaction.atomic():
+            if sign > 0:
+                affected = insert_links(
+                    user, klass, field_to_create_or_delete, changed)
+                message = error_create_message
+            else:
+                affected = delete_links(
+                    user, klass, field_to_create_or_delete, changed)
+                message = error_delete_message
+            if affected:
+                klass.on_toggle(user, affected, sign)
+        # Связь успел создать или удалить параллельный запрос.
+        errors.update(
+            (pk, (status.HTTP_400_BAD_REQUEST, message))
+            for pk in set(changed).difference(affected))
+    results = []
+    for pk in ids:
+        if pk in errors:
+            code, message = errors[pk]
+            results.append({'id': pk, 'status': code, 'errors ': message})
+        else:
+            results.append({'id': pk, 'status': success})
+    return Response({'results': results})
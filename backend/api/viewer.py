@@ -0,0 +1,88 @@
+from django.db import models
+from rest_framework import serializers
+
+from api.models import Favorite, ShoppingCart
+from users.models import Follow
+
+VIEWER_SOURCES = {
+    'following': (Follow, 'author_id'),
+    'favorite': (Favorite, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+}
+
+
+class Viewer:
+    """Подписки, избранное и корзина текущего пользователя.
+
+    Создаётся один раз на запрос. Идентификаторы подгружаются запросами
+    только по объектам текущей страницы, после чего все флаги
+    сериализаторов отвечаются из памяти."""
+
+    def __init__(self, user):
+        self.user = user
+        self.is_authenticated = bool(user and user.is_authenticated)
+        self._found = {kind: set() for kind in VIEWER_SOURCES}
+        self._checked = {kind: set() for kind in VIEWER_SOURCES}
+
+    @classmethod
+    def from_context(cls, context):
+        """Получить общий для запроса экземпляр из контекста сериализатора."""
+        request = context.get('request')
+        if request is None:
+            return cls(None)
+        viewer = getattr(request, 'viewer', None)
+        if viewer is None:
+            viewer = cls(request.user)
+            request.viewer = viewer
+        return viewer
+
+    def prime(self, kind, ids):
+        """Загрузить одним запросом флаги для пачки идентификаторов."""
+        if not self.is_authenticated:
+            return
+        ids = set(ids) - self._checked[kind]
+        if not ids:
+            return
+        model, field = VIEWER_SOURCES[kind]
+        self._found[kind].update(
+            model.objects.filter(
+                user=self.user, **{f'{field}__in': ids}
+            ).values_list(field, flat=True))
+        self._checked[kind].update(ids)
+
+    def has(self, kind, pk):
+        if not self.is_authenticated:
+            return False
+        self.prime(kind, (pk,))
+        return pk in self._found[kind]
+
+    def is_subscribed(self, author_id):
+        return self.has('following', author_id)
+
+    def is_favorited(self, recipe_id):
+        return self.has('favorite', recipe_id)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return self.has('shopping_cart', recipe_id)
+
+
+class ViewerListSerializer(serializers.ListSerializer):
+    """Перед отображением списка заранее загружает флаги для всей пачки."""
+    def to_representation(self, data):
+        items = list(
+            data.all() if isinstance(data, models.Manager) else data)
+        self.child.prime_viewer(self.child.viewer, items)
+        return super().to_representation(items)
+
+
+class ViewerFlagsMixin:
+    """Доступ сериализатора к состоянию текущего пользователя.
+
+    Сериализатор указывает в Meta list_serializer_class=ViewerListSerializer
+    и реализует prime_viewer для пачки объектов."""
+    @property
+    def viewer(self):
+        return Viewer.from_context(self.context)
+
+    def prime_viewer(self, viewer, items):
+        raise NotImplementedError
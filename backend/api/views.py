@@ -1,20 +1,27 @@
-from datetime import datetime as dt
-
-from django.db.models import F, Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, status, viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import SAFE_METHODS, AllowAny
+from rest_framework.permissions import (SAFE_METHODS, AllowAny, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api.authentication import get_stats
+from api.catalogs import ingredient_index, ingredient_snapshot, tag_snapshot
+from api.feed import feed_queryset
 from api.filters import RecipeFilter
-from api.models import Amount, Favorite, Ingredient, Recipe, ShoppingCart, Tag
-from api.paginators import PageLimitPagination
+from api.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from api.paginators import CursorLimitPagination, PageLimitPagination
 from api.permissions import IsOwnerOrReadOnly
 from api.serializers import (FavoriteSerializer, IngredientSerializer,
                              RecipeCreateSerializer, RecipeSerializer,
                              TagSerializer)
+from api.shopping_list import EXPORT_FORMATS
+from users.models import User
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -23,35 +30,56 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        return tag_snapshot.response(request)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     permission_classes = [AllowAny, ]
     pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
     serializer_class = IngredientSerializer
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return ingredient_snapshot.response(request)
+        return Response(ingredient_index.search(
+            name, settings.INGREDIENT_SEARCH_LIMIT))
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = PageLimitPagination
-    from api.utils import create_delete_obj
+    from api.utils import create_delete_obj, create_delete_objs
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    cursor_ordering = '-id'
 
     def get_queryset(self):
-        queryset = Recipe.objects
-        user = self.request.user
-        queryset = queryset.add_user_annotations(user.pk)
+        queryset = Recipe.objects.order_by('-id')
+        if self.action in ('list', 'retrieve'):
+            # Теги и ингредиенты загружает RecipeSerializer только для
+            # рецептов, которых нет в кэше.
+            queryset = queryset.select_related('author')
         return queryset
 
+    def perform_content_negotiation(self, request, force=False):
+        # В выгрузке списка покупок ?format= выбирает формат файла,
+        # а не рендерер DRF.
+        return super().perform_content_negotiation(
+            request,
+            force=force or self.action == 'download_shopping_cart')
+
     def get_permissions(self):
+        if self.action in (
+                'download_shopping_cart', 'shopping_cart_summary', 'feed'):
+            return [IsAuthenticated()]
         if self.action not in SAFE_METHODS:
             return [IsOwnerOrReadOnly()]
         return [AllowAny()]
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return RecipeSerializer
         elif self.action in ('shopping_cart', 'favorite'):
             return FavoriteSerializer
@@ -60,6 +88,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') - 1)
+        instance.delete()
+
     @action(
         detail=True,
         methods=['post', 'delete'])
@@ -84,6 +118,40 @@ class RecipeViewSet(viewsets.ModelViewSet):
             field_to_create_or_delete='recipe'
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart')
+    def shopping_cart_bulk(self, request):
+        return self.create_delete_objs(
+            klass=ShoppingCart,
+            error_create_message='Этот рецепт уже есть в Корзине',
+            error_delete_message='Этот рецепт не найден в Корзине',
+            field_to_create_or_delete='recipe')
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite')
+    def favorite_bulk(self, request):
+        return self.create_delete_objs(
+            klass=Favorite,
+            error_create_message='Этот рецепт уже есть в Избранном',
+            error_delete_message='Этот рецепт не найден в Избранном',
+            field_to_create_or_delete='recipe')
+
+    @action(
+        detail=False,
+        methods=['get'])
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь."""
+        queryset = self.filter_queryset(
+            feed_queryset(request.user).select_related('author'))
+        paginator = CursorLimitPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(
         detail=False,
         methods=['get'])
@@ -91,28 +159,56 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         """Качаем список с ингредиентами."""
         user = request.user
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': (
+                    'Доступные форматы: ' + ', '.join(EXPORT_FORMATS))},
+                status=status.HTTP_400_BAD_REQUEST)
         if not user.shopping_cart.all().exists():
             return Response(
                 {'error': 'Корзина пуста'},
                 status=status.HTTP_400_BAD_REQUEST)
-        ingredients = Amount.objects.filter(
-            recipe__in=(user.shopping_cart.values('recipe_id'))
-        ).values(
+        ingredients = user.shopping_list.values(
+            'amount',
             shop_ingredient=F('ingredient__name'),
             shop_measure=F('ingredient__measurement_unit')
-        ).annotate(amount=Sum('amount'))
-        filename = f'{user.username}_shopping_list.txt'
-        shopping_list = (
-            f'Список покупок для пользователя: {user.first_name}\n'
-            f'{dt.now().strftime("%H:%M  %m.%d.%Y")}\n\n')
-        for ing in ingredients:
-            shopping_list += (
-                f'{ing["shop_ingredient"]}: {ing["amount"]}'
-                f' {ing["shop_measure"]}\n'
-            )
-        shopping_list += '\n\nПосчитано в Foodgram'
-        response = HttpResponse(
-            shopping_list, content_type='text.txt; charset=utf-8'
-        )
+        ).order_by('shop_ingredient')
+        content_type, render = EXPORT_FORMATS[file_format]
+        filename = f'{user.username}_shopping_list.{file_format}'
+        response = StreamingHttpResponse(
+            render(user, ingredients.iterator()),
+            content_type=content_type)
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='shopping_cart/summary')
+    def shopping_cart_summary(self, request):
+        """Итоговые количества ингредиентов в корзине."""
+        ingredients = request.user.shopping_list.values_list(
+            'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        ).order_by('ingredient__name')
+        return Response({
+            'recipes': request.user.shopping_cart.count(),
+            'ingredients': [
+                {
+                    'id': pk,
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                    'amount': amount,
+                }
+                for pk, name, measurement_unit, amount in ingredients
+            ],
+        })
+
+
+class AuthCacheStatsView(APIView):
+    """Статистика кэша токенов текущего процесса."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_stats())
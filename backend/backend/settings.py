@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +64,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+# Потоки, в которых под ASGI выполняются запросы к Django.
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', default=20))
 
 DATABASES = {
     'default': {
@@ -71,9 +74,87 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='User'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='Password'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # Сколько секунд держать соединение открытым между запросами,
+        # 0 - закрывать после каждого запроса.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        # В режиме transaction pgbouncer отдаёт соединение с сервером
+        # только на время транзакции, курсоры на сервере при этом
+        # не работают.
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_POOL_MODE', default='session') == 'transaction'),
     }
 }
+# Проверять постоянное соединение в начале запроса и переподключаться,
+# если сервер базы его закрыл.
+DB_CONN_HEALTH_CHECKS = os.getenv(
+    'DB_CONN_HEALTH_CHECKS', default='true').lower() in ('true', '1')
+
+
+def get_replica_settings(address):
+    """Параметры реплики: адрес host[:port] или, для SQLite, путь к файлу.
+
+    Остальные параметры совпадают с основной базой."""
+    replica = dict(DATABASES['default'])
+    if replica['ENGINE'].endswith('sqlite3'):
+        replica['NAME'] = address
+    else:
+        replica['HOST'], _, port = address.partition(':')
+        replica['PORT'] = port or replica['PORT']
+    return replica
+
+
+# Реплики для чтения через запятую, например DB_REPLICAS=replica1,replica2.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1):
+    DATABASE_REPLICAS.append(f'replica{number}')
+    DATABASES[f'replica{number}'] = get_replica_settings(address.strip())
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter'] if DATABASE_REPLICAS else []
+# Сколько секунд клиент после записи читает с основной базы.
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', default=10))
+# Через сколько секунд снова пробовать недоступную реплику.
+DB_REPLICA_RETRY_SECONDS = int(
+    os.getenv('DB_REPLICA_RETRY_SECONDS', default=30))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    },
+    # Готовые представления рецептов. LocMemCache вытесняет давно
+    # не читавшиеся записи, FileBasedCache и Redis-совместимые бэкенды
+    # (например, django_redis.cache.RedisCache) общие для процессов.
+    'recipes': {
+        'BACKEND': os.getenv(
+            'RECIPE_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RECIPE_CACHE_LOCATION', default='recipes'),
+        'TIMEOUT': int(os.getenv('RECIPE_CACHE_TIMEOUT', default=86400)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('RECIPE_CACHE_MAX_ENTRIES', default=5000)),
+        },
+    },
+    # Токены авторизации в памяти процесса. Время жизни короткое:
+    # удаление токена в другом процессе сюда не доходит.
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tokens',
+        'TIMEOUT': int(os.getenv('AUTH_TOKEN_LOCAL_TTL', default=30)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('AUTH_TOKEN_LOCAL_MAX_ENTRIES', default=1000)),
+        },
+    },
+}
+
+# Время жизни токена в общем кэше. С CACHE_BACKEND в памяти процесса
+# общий кэш для токенов не используется.
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', default=300))
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -116,6 +197,11 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DEFAULT_FILE_STORAGE = os.getenv(
+    'FILE_STORAGE', default='api.storage.ContentAddressedStorage')
+
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', default=1))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
@@ -125,7 +211,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS':
@@ -133,6 +219,34 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# Наибольший размер страницы, который можно запросить параметром limit.
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', default=100))
+# exact - точный COUNT, estimate - оценка планировщика PostgreSQL
+# для выборок больше PAGINATION_ESTIMATE_THRESHOLD строк.
+PAGINATION_COUNT = os.getenv('PAGINATION_COUNT', default='exact')
+PAGINATION_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_ESTIMATE_THRESHOLD', default=10000))
+# Наибольшее число идентификаторов в одном пакетном запросе.
+BULK_MAX_IDS = int(os.getenv('BULK_MAX_IDS', default=100))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+
+# Рецепты авторов с большим числом подписчиков не раскладываются
+# по лентам, а подмешиваются в ленту при чтении.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=5000))
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', default=1000))
+# Сколько последних рецептов автора добавляется в ленту при подписке.
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', default=50))
+# Автор снова раскладывает рецепты по лентам, только когда подписчиков
+# стало на FEED_FANOUT_MARGIN меньше FEED_FANOUT_LIMIT: подписка и отписка
+# у самой границы не запускают заполнение лент каждый раз.
+FEED_FANOUT_MARGIN = int(os.getenv('FEED_FANOUT_MARGIN', default=500))
+FEED_BACKFILL_WORKERS = int(os.getenv('FEED_BACKFILL_WORKERS', default=1))
+
 DJOSER = {
     "LOGIN_FIELD": 'email',
 }
@@ -0,0 +1,37 @@
+"""Общая часть скриптов замеров.
+
+Скрипты запускаются из папки backend и пишут тестовые данные в базу
+из настроек, поэтому указывайте отдельную базу, например:
+
+    DB_NAME=/tmp/bench.sqlite3 python manage.py migrate
+    DB_NAME=/tmp/bench.sqlite3 python benchmarks/ingredient_search.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+
+def best_of(func, repeat=3):
+    """Лучшее время выполнения func из repeat попыток, в секундах."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(title, seconds):
+    if seconds < 0.001:
+        print(f'{title}: {seconds * 1e6:.0f} us')
+    else:
+        print(f'{title}: {seconds * 1e3:.1f} ms')
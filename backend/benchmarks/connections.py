@@ -0,0 +1,105 @@
+"""Постоянные соединения с базой и их проверка в начале запроса.
+
+Одни и те же GET-запросы проходят через WSGI-обработчик Django, как под
+gunicorn: в конце запроса соединения закрываются по CONN_MAX_AGE, в
+начале проверяются, если включён DB_CONN_HEALTH_CHECKS. Тестовый клиент
+Django соединения между запросами не закрывает и для замера не подходит.
+Сравниваются CONN_MAX_AGE=0 и 60, с проверкой соединений и без неё.
+
+Разница заметна на PostgreSQL, особенно на удалённом сервере:
+
+    DB_ENGINE=django.db.backends.postgresql DB_HOST=... \\
+        python benchmarks/connections.py
+"""
+import argparse
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from common import best_of, report
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+PATHS = (
+    '/api/recipes/?limit=6',
+    '/api/tags/',
+    '/api/ingredients/?name=%D1%81%D0%B0',
+)
+CONFIGURATIONS = (
+    (0, False),
+    (0, True),
+    (60, False),
+    (60, True),
+)
+
+
+class Opened:
+    """Счётчик новых соединений с базой."""
+
+    def __init__(self):
+        self.count = 0
+        connection_created.connect(self.opened)
+
+    def opened(self, **kwargs):
+        self.count += 1
+
+
+def configure(max_age, health_checks):
+    for connection in connections.all():
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+    settings.DB_CONN_HEALTH_CHECKS = health_checks
+
+
+def get(handler, path):
+    path, _, query = path.partition('?')
+    environ = {
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'wsgi.input': BytesIO(),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    response = handler(
+        environ, lambda status, headers: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        # Как сервер WSGI: здесь Django закрывает старые соединения.
+        response.close()
+    assert statuses[0].startswith('200'), (path, statuses[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--path', action='append', dest='paths',
+        help=f'Запрашиваемый путь, можно несколько. По умолчанию: {PATHS}')
+    options = parser.parse_args()
+    paths = options.paths or PATHS
+    handler = WSGIHandler()
+    opened = Opened()
+
+    def run():
+        for number in range(options.requests):
+            get(handler, paths[number % len(paths)])
+
+    for max_age, health_checks in CONFIGURATIONS:
+        configure(max_age, health_checks)
+        opened.count = 0
+        seconds = best_of(run, options.repeat)
+        report(
+            f'CONN_MAX_AGE={max_age}, проверка соединений '
+            f'{"включена" if health_checks else "выключена"}, '
+            f'соединений за {options.repeat} x {options.requests} '
+            f'запросов: {opened.count}, на запрос',
+            seconds / options.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Задержка поиска ингредиентов по названию на большом справочнике.
+
+Дополняет справочник синтетическими ингредиентами до --size записей
+и замеряет поиск по началу названия и поиск с ранжированием
+(сначала совпадения по началу, затем по подстроке) в сравнении
+с перебором всех названий в цикле.
+"""
+import argparse
+
+from common import best_of, report
+
+from api.catalogs import ingredient_index
+from api.models import Ingredient
+
+WORDS = (
+    'абрикос', 'баклажан', 'ваниль', 'горох', 'дыня', 'ежевика', 'жимолость',
+    'зелень', 'изюм', 'капуста', 'лук', 'морковь', 'нут', 'огурец', 'перец',
+    'редис', 'сок', 'томат', 'укроп', 'фасоль', 'хрен', 'цукини', 'чеснок',
+    'шпинат', 'щавель', 'яблоко',
+)
+QUERIES = ('сок', 'морк', 'перец', 'ябл', 'ваниль сок')
+
+
+def fill_catalog(size, batch_size=10000):
+    existing = Ingredient.objects.count()
+    batch = []
+    for number in range(existing, size):
+        first = WORDS[number % len(WORDS)]
+        second = WORDS[number // len(WORDS) % len(WORDS)]
+        batch.append(Ingredient(
+            name=f'{first} {second} {number}', measurement_unit='г'))
+        if len(batch) == batch_size:
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def naive_search(rows, query, limit):
+    """Перебор всех названий, как до появления индекса."""
+    query = query.lower()
+    prefix = [row for row in rows if row[1].lower().startswith(query)]
+    infix = [
+        row for row in rows
+        if query in row[1].lower() and not row[1].lower().startswith(query)]
+    return (sorted(prefix, key=lambda row: row[1].lower())
+            + sorted(infix, key=lambda row: row[1].lower()))[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--limit', type=int, default=50)
+    options = parser.parse_args()
+    fill_catalog(options.size)
+    report('Построение индекса', best_of(
+        lambda: ingredient_index.build(), repeat=1))
+    rows = ingredient_index.get()[1]
+    print(f'Ингредиентов в справочнике: {len(rows)}')
+    for query in QUERIES:
+        report(f'{query!r} по началу', best_of(
+            lambda: ingredient_index.startswith(query, options.limit), 20))
+        report(f'{query!r} с ранжированием', best_of(
+            lambda: ingredient_index.search(query, options.limit), 20))
+        report(f'{query!r} перебором', best_of(
+            lambda: naive_search(rows, query, options.limit), 3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Нагрузочный тест запущенного сервера: WSGI против ASGI.
+
+Скрипт не импортирует Django и обращается к серверу по HTTP, поэтому
+его можно запускать с любой машины. Сравнение конфигураций (без
+перезапуска процесса посреди замера):
+
+    export GUNICORN_WORKERS=1 GUNICORN_MAX_REQUESTS=0
+    SERVER_INTERFACE=wsgi gunicorn -c gunicorn.conf.py
+    python benchmarks/load_test.py http://127.0.0.1:8000 --clients 200
+
+    SERVER_INTERFACE=asgi gunicorn -c gunicorn.conf.py
+    python benchmarks/load_test.py http://127.0.0.1:8000 --clients 200
+
+С --slow N дополнительно держится N медленных клиентов, которые
+отправляют тело POST-запроса на вход по байту раз в 100 мс.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+PATHS = (
+    '/api/recipes/?limit=6',
+    '/api/recipes/?limit=6&cursor=',
+    '/api/tags/',
+    '/api/ingredients/?name=%D1%81%D0%B0',
+)
+SLOW_BODY = b'{"email": "slow@example.com", "password": "' + b'x' * 150 + b'"}'
+
+
+async def read_body(reader, headers):
+    if headers.get('transfer-encoding') == 'chunked':
+        body = b''
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            body += await reader.readexactly(size + 2)
+            if not size:
+                return body
+    return await reader.readexactly(int(headers.get('content-length', 0)))
+
+
+async def request(reader, writer, host, path):
+    """GET по открытому соединению: код ответа и закрыто ли соединение."""
+    writer.write(
+        f'GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode('ascii'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin1').strip()
+        if not line:
+            break
+        name, value = line.split(':', 1)
+        headers[name.lower()] = value.strip()
+    await read_body(reader, headers)
+    return status, headers.get('connection') == 'close'
+
+
+class LoadTest:
+    def __init__(self, url, total, paths):
+        self.url = urlsplit(url)
+        self.total = total
+        self.paths = paths
+        self.sent = 0
+        self.errors = 0
+        self.latencies = []
+        self.done = False
+
+    async def connect(self):
+        return await asyncio.open_connection(
+            self.url.hostname, self.url.port or 80)
+
+    async def get(self, connection, path):
+        """Запрос по соединению клиента или по новому соединению.
+
+        Простаивающее соединение сервер может закрыть, например при
+        перезапуске процесса, тогда запрос повторяется по новому."""
+        if connection is not None:
+            try:
+                return connection, await request(
+                    *connection, self.url.netloc, path)
+            except (OSError, asyncio.IncompleteReadError):
+                connection[1].close()
+        connection = await self.connect()
+        return connection, await request(*connection, self.url.netloc, path)
+
+    async def client(self):
+        connection = None
+        while self.sent < self.total:
+            path = self.paths[self.sent % len(self.paths)]
+            self.sent += 1
+            start = time.perf_counter()
+            try:
+                connection, (status, closed) = await self.get(
+                    connection, path)
+                if status != 200:
+                    self.errors += 1
+                if closed:
+                    connection[1].close()
+                    connection = None
+            except (OSError, ValueError, IndexError,
+                    asyncio.IncompleteReadError):
+                self.errors += 1
+                connection = None
+            self.latencies.append(time.perf_counter() - start)
+        if connection is not None:
+            connection[1].close()
+
+    async def slow_client(self):
+        """POST на вход, тело которого приходит по байту раз в 100 мс."""
+        while not self.done:
+            try:
+                _, writer = await self.connect()
+                writer.write(
+                    b'POST /api/auth/token/login/ HTTP/1.1\r\n'
+                    b'Host: %s\r\nContent-Type: application/json\r\n'
+                    b'Content-Length: %d\r\n\r\n'
+                    % (self.url.netloc.encode(), len(SLOW_BODY)))
+                for byte in SLOW_BODY:
+                    if self.done:
+                        break
+                    writer.write(bytes([byte]))
+                    await writer.drain()
+                    await asyncio.sleep(0.1)
+                writer.close()
+            except OSError:
+                await asyncio.sleep(0.1)
+
+    async def run(self, clients, slow):
+        slow_clients = [
+            asyncio.ensure_future(self.slow_client()) for _ in range(slow)]
+        if slow:
+            # Медленные клиенты успевают занять соединения.
+            await asyncio.sleep(1)
+        start = time.perf_counter()
+        await asyncio.gather(*(self.client() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        self.done = True
+        for task in slow_clients:
+            task.cancel()
+        await asyncio.gather(*slow_clients, return_exceptions=True)
+        return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('url', help='Адрес сервера, http://host:port')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--slow', type=int, default=0)
+    parser.add_argument(
+        '--path', action='append', dest='paths',
+        help=f'Запрашиваемый путь, можно несколько. По умолчанию: {PATHS}')
+    options = parser.parse_args()
+    test = LoadTest(options.url, options.requests, options.paths or PATHS)
+    elapsed = asyncio.get_event_loop().run_until_complete(
+        test.run(options.clients, options.slow))
+    latencies = sorted(test.latencies)
+    print(
+        f'Клиентов: {options.clients}, медленных: {options.slow}, '
+        f'запросов: {len(latencies)}, ошибок: {test.errors}')
+    print(
+        f'{len(latencies) / elapsed:.0f} запросов/с, '
+        f'медиана {statistics.median(latencies) * 1000:.0f} мс, '
+        f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} мс, '
+        f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f} мс')
+
+
+if __name__ == '__main__':
+    main()
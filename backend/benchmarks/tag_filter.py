@@ -0,0 +1,112 @@
+"""Фильтр рецептов по трём тэгам на большом наборе данных.
+
+Дополняет базу синтетическими рецептами до --recipes записей (у каждого
+от одного до трёх тэгов из --tags) и сравнивает способы отбора рецептов
+хотя бы с одним из тэгов: JOIN с DISTINCT, id__in с подзапросом и
+EXISTS, который использует RecipeFilter. Для каждого замеряются COUNT
+и первая страница, затем полный GET /api/recipes/ с пагинацией по
+номеру страницы и по курсору.
+"""
+import argparse
+import random
+
+from common import best_of, report
+from django.db.models import Exists, OuterRef
+from rest_framework.test import APIClient
+
+from api.models import Recipe, Tag
+from users.models import User
+
+AUTHORS = 1000
+PAGE_SIZE = 6
+RecipeTag = Recipe.tags.through
+
+
+def fill_tags(count):
+    Tag.objects.bulk_create(
+        [
+            Tag(name=f'Тэг {number}', color='#E26C2D', slug=f'tag{number}')
+            for number in range(count)
+        ],
+        ignore_conflicts=True)
+    return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+
+def fill_authors():
+    User.objects.bulk_create(
+        [
+            User(
+                username=f'bench{number}', email=f'bench{number}@example.com',
+                first_name='Автор', last_name=str(number))
+            for number in range(AUTHORS)
+        ],
+        ignore_conflicts=True)
+    return list(User.objects.filter(
+        username__startswith='bench').values_list('id', flat=True))
+
+
+def fill_recipes(size, tag_ids, batch_size=10000):
+    existing = Recipe.objects.count()
+    if existing >= size:
+        return
+    author_ids = fill_authors()
+    random.seed(existing)
+    for start in range(existing, size, batch_size):
+        count = min(batch_size, size - start)
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author_id=random.choice(author_ids),
+                name=f'Рецепт {start + number}',
+                image='img/recipe.png',
+                text='Описание',
+                cooking_time=random.randint(1, 120))
+            for number in range(count))
+        if recipes[0].pk is None:
+            # SQLite до 3.35 не возвращает идентификаторы из bulk_create.
+            recipes = Recipe.objects.order_by('-id')[:count]
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe in recipes
+            for tag_id in random.sample(tag_ids, random.randint(1, 3)))
+        print(f'Рецептов: {start + count}')
+
+
+def get_querysets(tag_ids):
+    recipes = Recipe.objects.order_by('-id')
+    return {
+        'JOIN + DISTINCT': recipes.filter(tags__id__in=tag_ids).distinct(),
+        'id__in': recipes.filter(id__in=RecipeTag.objects.filter(
+            tag_id__in=tag_ids).values('recipe_id')),
+        'EXISTS': recipes.filter(Exists(RecipeTag.objects.filter(
+            recipe_id=OuterRef('pk'), tag_id__in=tag_ids))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=1000000)
+    parser.add_argument('--tags', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+    tag_ids = fill_tags(options.tags)
+    fill_recipes(options.recipes, tag_ids)
+    selected = tag_ids[:3]
+    for title, queryset in get_querysets(selected).items():
+        report(f'{title}: COUNT', best_of(
+            lambda: queryset.count(), options.repeat))
+        report(f'{title}: первая страница', best_of(
+            lambda: list(queryset[:PAGE_SIZE]), options.repeat))
+    slugs = Tag.objects.filter(id__in=selected).values_list('slug', flat=True)
+    url = '/api/recipes/?limit={}&{}'.format(
+        PAGE_SIZE, '&'.join(f'tags={slug}' for slug in slugs))
+    client = APIClient()
+    for title, query in (
+            ('по номеру страницы', ''), ('по курсору', '&cursor=')):
+        response = client.get(url + query)
+        assert response.status_code == 200, response.content
+        report(f'GET /api/recipes/ {title}', best_of(
+            lambda: client.get(url + query), options.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Настройки gunicorn для контейнера web.
+
+Число процессов и потоков подбирается по доступным процессорам,
+любое значение можно переопределить переменной окружения.
+"""
+import os
+import threading
+
+CPU_COUNT = len(os.sched_getaffinity(0))
+# asgi - процессы uvicorn: запросы принимает и ответы отправляет цикл
+# событий, Django работает в пуле из ASGI_THREADS потоков.
+SERVER_INTERFACE = os.getenv('SERVER_INTERFACE', default='wsgi')
+
+wsgi_app = f'backend.{SERVER_INTERFACE}:application'
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+# Версии справочников, закрепление за основной базой и токены видны
+# всем процессам только через общий CACHE_BACKEND. С кэшем в памяти
+# процесса по умолчанию запускается один процесс.
+SHARED_CACHE = 'locmem' not in os.getenv('CACHE_BACKEND', default='locmem')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', default=CPU_COUNT * 2 + 1 if SHARED_CACHE else 1))
+# Запросы в основном ждут базу и кэш, поэтому каждый процесс
+# обслуживает их несколькими потоками.
+worker_class = os.getenv(
+    'GUNICORN_WORKER_CLASS',
+    default=(
+        'uvicorn.workers.UvicornWorker' if SERVER_INTERFACE == 'asgi'
+        else 'gthread'))
+threads = int(os.getenv('GUNICORN_THREADS', default=4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', default=5))
+# Django и все модули загружаются один раз в главном процессе,
+# рабочие процессы получают их готовыми при fork.
+preload_app = True
+# Процесс перезапускается после max_requests запросов, разброс
+# не даёт всем процессам перезапуститься одновременно.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=1000))
+max_requests_jitter = int(
+    os.getenv('GUNICORN_MAX_REQUESTS_JITTER', default=max_requests // 10))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', default='-')
+
+
+def pre_fork(server, worker):
+    """Соединения главного процесса не должны достаться рабочим."""
+    from django.db import connections
+
+    connections.close_all()
+
+
+def post_fork(server, worker):
+    """Справочники, собранные до fork, сверяются с текущими версиями.
+
+    Соединения для запросов открывает post_worker_init в нужных потоках."""
+    from django.db import connections
+
+    from api.catalogs import warm_catalogs
+
+    warm_catalogs()
+    connections.close_all()
+
+
+def warm_connection(barrier):
+    from django.db import DatabaseError, connection
+
+    try:
+        connection.ensure_connection()
+    except DatabaseError:
+        pass
+    barrier.wait(timeout=timeout)
+
+
+def post_worker_init(worker):
+    """Открыть соединение с базой в каждом потоке рабочего процесса.
+
+    Соединения Django принадлежат потокам, поэтому задачи ждут друг
+    друга: пул потоков запускает новый поток на каждую задачу."""
+    if SERVER_INTERFACE == 'asgi':
+        from django.conf import settings
+
+        from api.handlers import executor
+
+        pool, size = executor, settings.ASGI_THREADS
+    else:
+        pool, size = getattr(worker, 'tpool', None), worker.cfg.threads
+    if pool is None:
+        warm_connection(threading.Barrier(1))
+        return
+    barrier = threading.Barrier(size)
+    for _ in range(size):
+        pool.submit(warm_connection, barrier)
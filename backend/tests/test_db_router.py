@@ -0,0 +1,111 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (DEFAULT_DB_ALIAS, OperationalError, connections, router,
+                       transaction)
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import db_router
+from users.models import User
+
+REPLICA = 'replica1'
+REPLICA_NAME = os.path.join(tempfile.mkdtemp(), 'replica.sqlite3')
+
+# Реплика - второй файл SQLite, тестовая база для неё создаётся
+# вместе с основной.
+connections.settings[REPLICA] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': REPLICA_NAME,
+    'TEST': {'NAME': REPLICA_NAME},
+}
+connections.ensure_defaults(REPLICA)
+connections.prepare_test_settings(REPLICA)
+
+
+@override_settings(
+    DATABASE_ROUTERS=['api.db_router.ReplicaRouter'],
+    DATABASE_REPLICAS=[REPLICA])
+class ReplicaRouterTests(TransactionTestCase):
+    """Чтение с реплики и запись в основную базу.
+
+    Внутри transaction.atomic чтение идёт с основной базы, поэтому
+    тесты не оборачиваются в транзакцию."""
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        cache.clear()
+        db_router._down_until.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def count_queries(self, client, method, url):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            with CaptureQueriesContext(connections[REPLICA]) as replica:
+                response = getattr(client, method)(url)
+        self.assertLess(response.status_code, 400)
+        return len(primary.captured_queries), len(replica.captured_queries)
+
+    def test_get_reads_replica(self):
+        _, replica = self.count_queries(APIClient(), 'get', '/api/users/')
+        self.assertGreater(replica, 0)
+
+    def test_write_pins_client_to_primary(self):
+        with mock.patch.object(
+                db_router.cache, 'set_many',
+                wraps=db_router.cache.set_many) as set_many:
+            primary, replica = self.count_queries(
+                self.client, 'post', f'/api/users/{self.author.pk}/subscribe/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.assertEqual(
+            set_many.call_args[0][1], settings.DB_REPLICA_PIN_SECONDS)
+        _, replica = self.count_queries(self.client, 'get', '/api/users/')
+        self.assertEqual(replica, 0)
+        _, replica = self.count_queries(APIClient(), 'get', '/api/users/')
+        self.assertGreater(replica, 0)
+        cache.clear()
+        _, replica = self.count_queries(self.client, 'get', '/api/users/')
+        self.assertGreater(replica, 0)
+
+    def test_atomic_reads_primary(self):
+        token = db_router._state.set(db_router.RoutingState(True))
+        try:
+            with transaction.atomic():
+                self.assertEqual(
+                    router.db_for_read(User), DEFAULT_DB_ALIAS)
+            self.assertEqual(router.db_for_read(User), REPLICA)
+        finally:
+            db_router._state.reset(token)
+
+    def test_missing_replica_falls_back_to_primary(self):
+        token = db_router._state.set(db_router.RoutingState(True))
+        try:
+            with override_settings(DATABASE_REPLICAS=[]):
+                self.assertEqual(router.db_for_read(User), DEFAULT_DB_ALIAS)
+        finally:
+            db_router._state.reset(token)
+
+    def test_broken_replica_falls_back_to_primary(self):
+        with mock.patch.object(
+                connections[REPLICA], 'ensure_connection',
+                side_effect=OperationalError('unable to open database')):
+            with CaptureQueriesContext(
+                    connections[DEFAULT_DB_ALIAS]) as primary:
+                response = APIClient().get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(primary.captured_queries), 0)
+        self.assertIn(REPLICA, db_router._down_until)
+        # Недоступная реплика пропускается DB_REPLICA_RETRY_SECONDS секунд.
+        _, replica = self.count_queries(APIClient(), 'get', '/api/users/')
+        self.assertEqual(replica, 0)
@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import feed
+from api.models import Recipe, TimelineEntry
+from users.models import FeedState, User
+
+
+@override_settings(FEED_FANOUT_LIMIT=3, FEED_FANOUT_MARGIN=2)
+class FeedFanoutTests(TestCase):
+    """Автор становится популярным выше FEED_FANOUT_LIMIT и возвращается
+    к раскладке по лентам в фоне, только потеряв FEED_FANOUT_MARGIN
+    подписчиков."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', image='img/recipe.png',
+            text='Описание', cooking_time=10)
+        cls.followers = [
+            User.objects.create_user(
+                username=f'follower{number}',
+                email=f'follower{number}@example.com', password='pass')
+            for number in range(4)
+        ]
+
+    def setUp(self):
+        patcher = mock.patch.object(feed._executor, 'submit')
+        self.submit = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def toggle(self, follower, method):
+        client = APIClient()
+        client.force_authenticate(follower)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(client, method)(
+                f'/api/users/{self.author.pk}/subscribe/')
+        self.assertIn(response.status_code, (201, 204))
+
+    def feed_ids(self, follower):
+        client = APIClient()
+        client.force_authenticate(follower)
+        response = client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def feed_state(self):
+        self.author.refresh_from_db(fields=['feed_state'])
+        return self.author.feed_state
+
+    def test_popular_author_is_read_from_follows(self):
+        for follower in self.followers:
+            self.toggle(follower, 'post')
+        self.assertEqual(self.feed_state(), FeedState.POPULAR)
+        self.assertEqual(self.feed_ids(self.followers[0]), [self.recipe.pk])
+
+    def test_no_backfill_at_threshold(self):
+        for follower in self.followers:
+            self.toggle(follower, 'post')
+        for _ in range(3):
+            self.toggle(self.followers[-1], 'delete')
+            self.toggle(self.followers[-1], 'post')
+        self.toggle(self.followers[-1], 'delete')
+        self.assertEqual(self.feed_state(), FeedState.POPULAR)
+        self.submit.assert_not_called()
+
+    def test_backfill_below_margin(self):
+        for follower in self.followers:
+            self.toggle(follower, 'post')
+        TimelineEntry.objects.all().delete()
+        for follower in self.followers[1:]:
+            self.toggle(follower, 'delete')
+        self.submit.assert_called_once_with(
+            feed._run_backfill, self.author.pk)
+        self.assertEqual(self.feed_ids(self.followers[0]), [self.recipe.pk])
+        feed.backfill_author(self.author.pk)
+        self.assertEqual(self.feed_state(), FeedState.FANOUT)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.followers[0], recipe=self.recipe).exists())
+        self.assertEqual(self.feed_ids(self.followers[0]), [self.recipe.pk])
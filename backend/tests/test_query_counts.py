@@ -0,0 +1,82 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.models import Amount, Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Follow, User
+
+
+class RecipeQueryCountTests(TestCase):
+    """Число запросов к базе не зависит от размера страницы и рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(
+            username='viewer', email='viewer@example.com', password='pass')
+        authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com', password='pass')
+            for number in range(4)
+        ]
+        Follow.objects.create(user=cls.viewer, author=authors[0])
+        tags = [
+            Tag.objects.create(
+                name=f'Тэг {number}', color='#FFFFFF', slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(5)
+        ]
+        for number in range(10):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}', image='img/recipe.png',
+                text='Описание', cooking_time=10)
+            recipe.tags.set(tags[:number % len(tags) + 1])
+            Amount.objects.bulk_create(
+                Amount(recipe=recipe, ingredient=ingredient, amount=100)
+                for ingredient in ingredients[:number % len(ingredients) + 1])
+            if number % 2:
+                Favorite.objects.create(user=cls.viewer, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.viewer, recipe=recipe)
+        cls.small_recipe = Recipe.objects.get(name='Рецепт 0')
+        cls.large_recipe = Recipe.objects.get(name='Рецепт 4')
+        cls.token = Token.objects.create(user=cls.viewer)
+
+    def get_clients(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return {'anonymous': APIClient(), 'authenticated': client}
+
+    def count_queries(self, client, url):
+        # Представления рецептов строятся заново, как при пустом кэше.
+        caches['recipes'].clear()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_list(self):
+        for name, client in self.get_clients().items():
+            with self.subTest(client=name):
+                client.get('/api/recipes/?limit=1')
+                small = self.count_queries(client, '/api/recipes/?limit=2')
+                large = self.count_queries(client, '/api/recipes/?limit=10')
+                self.assertEqual(small, large)
+
+    def test_retrieve(self):
+        for name, client in self.get_clients().items():
+            with self.subTest(client=name):
+                client.get(f'/api/recipes/{self.small_recipe.pk}/')
+                small = self.count_queries(
+                    client, f'/api/recipes/{self.small_recipe.pk}/')
+                large = self.count_queries(
+                    client, f'/api/recipes/{self.large_recipe.pk}/')
+                self.assertEqual(small, large)
@@ -0,0 +1,82 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.models import Amount, Ingredient, Recipe, ShoppingListItem
+from users.models import User
+
+
+class ShoppingListTests(TestCase):
+    """Выгрузка списка покупок по рецептам из корзины."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass',
+            first_name='Покупатель')
+        cls.sugar = Ingredient.objects.create(
+            name='Сахар', measurement_unit='г')
+        cls.milk = Ingredient.objects.create(
+            name='Молоко', measurement_unit='мл')
+        cls.recipes = []
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {number}',
+                image='img/recipe.png', text='Описание', cooking_time=10)
+            Amount.objects.create(
+                recipe=recipe, ingredient=cls.sugar, amount=100)
+            Amount.objects.create(
+                recipe=recipe, ingredient=cls.milk, amount=200 + number)
+            cls.recipes.append(recipe)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        for recipe in self.recipes:
+            response = self.client.post(
+                f'/api/recipes/{recipe.pk}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+
+    def download(self, file_format):
+        response = self.client.get(
+            f'/api/recipes/download_shopping_cart/?format={file_format}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_txt(self):
+        content = self.download('txt').decode()
+        self.assertIn('Сахар: 200 г', content)
+        self.assertIn('Молоко: 401 мл', content)
+
+    def test_pdf(self):
+        content = self.download('pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def get_totals(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user).values_list('ingredient__name', 'amount'))
+
+    def test_amount_changes(self):
+        amount = Amount.objects.get(
+            recipe=self.recipes[0], ingredient=self.milk)
+        amount.amount = 300
+        amount.save()
+        self.assertEqual(self.get_totals(), {'Сахар': 200, 'Молоко': 501})
+        amount.delete()
+        self.assertEqual(self.get_totals(), {'Сахар': 200, 'Молоко': 201})
+
+    def test_recipe_update(self):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipes[0].pk}/',
+            {'ingredients': [{'id': self.sugar.pk, 'amount': 50}]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_totals(), {'Сахар': 150, 'Молоко': 201})
+
+    def test_recipe_delete(self):
+        self.recipes[0].delete()
+        self.assertEqual(self.get_totals(), {'Сахар': 100, 'Молоко': 201})
+        response = self.client.delete(f'/api/recipes/{self.recipes[1].pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_totals(), {})
@@ -0,0 +1,27 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from users.models import User
+
+
+class SubscribeResponseTests(TestCase):
+    """Ответ на подписку показывает счётчики после неё."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.followers = [
+            User.objects.create_user(
+                username=f'follower{number}',
+                email=f'follower{number}@example.com', password='pass')
+            for number in range(2)
+        ]
+
+    def test_followers_count(self):
+        for number, follower in enumerate(self.followers, start=1):
+            client = APIClient()
+            client.force_authenticate(follower)
+            response = client.post(f'/api/users/{self.author.pk}/subscribe/')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()['followers_count'], number)
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_popular_authors(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).update(feed_state=2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_state',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Раскладываются по лентам'), (1, 'Ленты заполняются'), (2, 'Подмешиваются при чтении')], default=0, editable=False, verbose_name='Лента подписчиков'),
+        ),
+        migrations.RunPython(mark_popular_authors, migrations.RunPython.noop),
+    ]
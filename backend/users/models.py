@@ -1,8 +1,37 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import F
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """Не перезаписывать счётчики при сохранении существующей записи.
+
+    Поля counter_fields меняются только выражениями F(), а save() без
+    update_fields записал бы значения, прочитанные в начале запроса,
+    и потерял бы изменения из параллельных запросов."""
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+                not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')
+                and not self._state.adding):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields]
+        super().save(*args, **kwargs)
+
+
+class FeedState(models.IntegerChoices):
+    """Как рецепты автора попадают в ленты подписчиков."""
+    FANOUT = 0, 'Раскладываются по лентам'
+    BACKFILL = 1, 'Ленты заполняются'
+    POPULAR = 2, 'Подмешиваются при чтении'
+
+
+class User(CounterFieldsMixin, AbstractUser):
     username = models.CharField(
         'Login пользователя',
         max_length=150,
@@ -28,6 +57,25 @@ class User(AbstractUser):
         max_length=150,
         blank=False,
     )
+    recipes_count = models.IntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.IntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+
+    feed_state = models.PositiveSmallIntegerField(
+        'Лента подписчиков',
+        choices=FeedState.choices,
+        default=FeedState.FANOUT,
+        editable=False,
+    )
+
+    counter_fields = ('recipes_count', 'followers_count', 'feed_state')
 
     class Meta:
         ordering = ('id',)
@@ -62,3 +110,13 @@ class Follow(models.Model):
 
     def __str__(self) -> str:
         return f'{self.user} подписан на {self.author}'
+
+    @classmethod
+    def on_toggle(cls, user, author_ids, sign):
+        """Обновление счётчика подписчиков авторов и ленты подписок."""
+        # Импорт здесь: api.models зависит от users.models.
+        from api.feed import follow_changed
+
+        User.objects.filter(pk__in=author_ids).update(
+            followers_count=F('followers_count') + sign)
+        follow_changed(user, author_ids, sign)
@@ -1,10 +1,21 @@
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
+from api.images import ImageVariantsField
 from api.models import Recipe
+from api.viewer import ViewerFlagsMixin, ViewerListSerializer
 from users.models import User
 
 
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не задан."""
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
 class UserCreateSerializer(UserCreateSerializer):
     class Meta:
         model = User
@@ -18,11 +29,12 @@ class UserCreateSerializer(UserCreateSerializer):
         )
 
 
-class UserListOrDetailSerializer(UserSerializer):
+class UserListOrDetailSerializer(ViewerFlagsMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
+        list_serializer_class = ViewerListSerializer
         fields = (
             'email',
             'id',
@@ -30,32 +42,38 @@ class UserListOrDetailSerializer(UserSerializer):
             'first_name',
             'last_name',
             'is_subscribed',
+            'recipes_count',
+            'followers_count',
         )
 
+    def prime_viewer(self, viewer, users):
+        viewer.prime('following', (user.pk for user in users))
+
     def get_is_subscribed(self, author):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        return user.follower.filter(author=author).exists()
+        return self.viewer.is_subscribed(author.pk)
 
 
 class RecipeForSubsciptionsSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time")
 
 
-class UserSubscriptionsSerializer(serializers.ModelSerializer):
-    recipes = RecipeForSubsciptionsSerializer(read_only=True, many=True)
-    recipes_count = serializers.SerializerMethodField()
+class UserSubscriptionsSerializer(
+        ViewerFlagsMixin, serializers.ModelSerializer):
+    recipes = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
+        list_serializer_class = ViewerListSerializer
         fields = (
             'email',
             'id',
@@ -64,22 +82,22 @@ class UserSubscriptionsSerializer(serializers.ModelSerializer):
             'last_name',
             'is_subscribed',
             'recipes',
-            'recipes_count'
+            'recipes_count',
+            'followers_count',
         )
 
-    def get_recipes_count(self, user):
-        return user.recipes.all().count()
-
-    def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = (
-            obj.author.recipe.all()[:int(limit)] if limit
-            else obj.author.recipe.all())
+    def get_recipes(self, author):
+        recipes = author.recipes.all()
+        limit = get_recipes_limit(self.context['request'])
+        if limit is not None:
+            recipes = recipes[:limit]
         return RecipeForSubsciptionsSerializer(
             recipes,
-            many=True).data
+            many=True,
+            context=self.context).data
+
+    def prime_viewer(self, viewer, users):
+        viewer.prime('following', (user.pk for user in users))
 
     def get_is_subscribed(self, author):
-        user = self.context['request'].user
-        return user.follower.filter(author=author).exists()
+        return self.viewer.is_subscribed(author.pk)
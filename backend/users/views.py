@@ -1,15 +1,17 @@
+from django.db.models import OuterRef, Prefetch, Subquery
 from djoser.serializers import SetPasswordSerializer
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from api.models import Recipe
 from api.paginators import PageLimitPagination
 from api.permissions import IsOwnerOrReadOnly
 from users.models import Follow, User
 from users.serializers import (UserCreateSerializer,
                                UserListOrDetailSerializer,
-                               UserSubscriptionsSerializer)
+                               UserSubscriptionsSerializer, get_recipes_limit)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -17,11 +19,33 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     permission_classes = [AllowAny, ]
     http_method_names = ['get', 'post', 'delete']
+    cursor_ordering = 'id'
 
-    from api.utils import create_delete_obj
+    from api.utils import create_delete_obj, create_delete_objs
 
     def get_instance(self):
-        return self.request.user
+        # Пользователь из кэша токенов не видит изменений счётчиков
+        # рецептов и подписчиков, поэтому профиль читается из базы.
+        return self.get_queryset().get(pk=self.request.user.pk)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('subscribe', 'subscriptions'):
+            queryset = queryset.prefetch_related(
+                Prefetch('recipes', queryset=self.get_recipes_queryset()))
+        return queryset
+
+    def get_recipes_queryset(self):
+        """Последние рецепты авторов, не более recipes_limit на автора."""
+        recipes = Recipe.objects.order_by('-id')
+        limit = get_recipes_limit(self.request)
+        if limit is not None:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-id').values('id')[:limit]))
+        return recipes.only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time', 'author')
 
     def destroy(self, request, *args, **kwargs):
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -52,7 +76,7 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.request.user.set_password(serializer.data["new_password"])
-        self.request.user.save()
+        self.request.user.save(update_fields=["password"])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -67,6 +91,18 @@ class UserViewSet(viewsets.ModelViewSet):
             error_delete_message='Вы не подписаны на этого Автора',
             field_to_create_or_delete='author')
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated, ],
+        url_path='subscribe')
+    def subscribe_bulk(self, request):
+        return self.create_delete_objs(
+            klass=Follow,
+            error_create_message='Вы уже подписаны на этого Автора',
+            error_delete_message='Вы не подписаны на этого Автора',
+            field_to_create_or_delete='author')
+
     @action(
         detail=False,
         methods=['get'],
@@ -74,7 +110,7 @@ class UserViewSet(viewsets.ModelViewSet):
     def subscriptions(self, request):
         """Получить на кого пользователь подписан."""
         user = request.user
-        queryset = User.objects.filter(
+        queryset = self.get_queryset().filter(
             id__in=(user.follower.values('author_id')))
         pages = self.paginate_queryset(queryset)
         serializer = UserSubscriptionsSerializer(